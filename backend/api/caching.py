@@ -0,0 +1,80 @@
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from recipes.catalog import get_catalog
+from recipes.models import Recipe
+
+GENERATION_KEY = 'recipes:generation:{}'
+RESPONSE_KEY = 'recipes:anonymous:{}'
+BODY_KEY = 'recipes:body:{}'
+
+
+def get_generations(scopes):
+    keys = [GENERATION_KEY.format(scope) for scope in scopes]
+    generations = cache.get_many(keys)
+    missing = {
+        key: uuid.uuid4().hex for key in keys if key not in generations
+    }
+    if missing:
+        cache.set_many(missing, timeout=None)
+        generations.update(missing)
+    return [generations[key] for key in keys]
+
+
+def bump_generations(scopes):
+    cache.set_many(
+        {GENERATION_KEY.format(scope): uuid.uuid4().hex for scope in scopes},
+        timeout=None,
+    )
+
+
+def invalidate_recipe(recipe_id, author_id, tag_ids=()):
+    scopes = ['all', f'recipe:{recipe_id}', f'author:{author_id}']
+    scopes += [f'tag:{tag_id}' for tag_id in set(tag_ids)]
+    transaction.on_commit(lambda: bump_generations(scopes))
+
+
+def invalidate_recipes(recipe_ids):
+    tag_ids = list(get_catalog().tags)
+    for recipe_id, author_id in Recipe.objects.filter(
+        pk__in=recipe_ids
+    ).values_list('pk', 'author'):
+        invalidate_recipe(recipe_id, author_id, tag_ids)
+
+
+def invalidate_recipe_detail(recipe_id):
+    transaction.on_commit(lambda: bump_generations([f'recipe:{recipe_id}']))
+
+
+def response_key(parts, scopes):
+    digest = hashlib.md5(
+        repr((parts, get_generations(scopes))).encode()
+    ).hexdigest()
+    return RESPONSE_KEY.format(digest)
+
+
+def get_response(key):
+    return cache.get(key)
+
+
+def set_response(key, data, etag, last_modified=None):
+    cache.set(
+        key,
+        (data, etag, last_modified),
+        timeout=settings.RECIPES_CACHE_TIMEOUT,
+    )
+
+
+def body_key(parts):
+    return BODY_KEY.format(hashlib.md5(repr(parts).encode()).hexdigest())
+
+
+def get_bodies(keys):
+    return cache.get_many(keys)
+
+
+def set_bodies(bodies):
+    cache.set_many(bodies, timeout=settings.RECIPES_CACHE_TIMEOUT)
@@ -1,13 +1,22 @@
 from django_filters import rest_framework as filters
-from recipes.models import Recipe, Tag
+from recipes.catalog import get_catalog
+from recipes.models import Recipe
+from rest_framework.filters import OrderingFilter
+
+TAGS_MATCH_CHOICES = (('any', 'Любой из тэгов'), ('all', 'Все тэги'))
+
+
+def tag_choices():
+    return [(slug, slug) for slug in get_catalog().tag_ids_by_slug]
 
 
 class RecipeFilter(filters.FilterSet):
     author = filters.NumberFilter(field_name='author__id')
-    tags = filters.ModelMultipleChoiceFilter(
-        field_name='tags__slug',
-        to_field_name='slug',
-        queryset=Tag.objects.all(),
+    tags = filters.MultipleChoiceFilter(
+        choices=tag_choices, method='filter_tags'
+    )
+    tags_match = filters.ChoiceFilter(
+        choices=TAGS_MATCH_CHOICES, method='filter_tags_match'
     )
     is_favorited = filters.BooleanFilter(
         field_name='is_favorited', method='filter_is_favorited'
@@ -15,17 +24,51 @@ class RecipeFilter(filters.FilterSet):
     is_in_shopping_cart = filters.BooleanFilter(
         field_name='is_in_shopping_cart', method='filter_is_in_shopping_cart'
     )
+    search = filters.CharFilter(method='filter_search')
 
     class Meta:
         model = Recipe
-        fields = ['author', 'tags', 'is_favorited', 'is_in_shopping_cart']
+        fields = [
+            'author',
+            'tags',
+            'tags_match',
+            'is_favorited',
+            'is_in_shopping_cart',
+            'search',
+        ]
+
+    def filter_tags(self, queryset, name, value):
+        tag_ids = get_catalog().tag_ids_by_slug
+        return queryset.with_tags(
+            [tag_ids[slug] for slug in value],
+            match_all=self.form.cleaned_data.get('tags_match') == 'all',
+        )
+
+    def filter_tags_match(self, queryset, name, value):
+        return queryset
 
     def filter_is_favorited(self, queryset, name, value):
         if self.request.user.is_authenticated and value:
-            return queryset.filter(favorite__user=self.request.user)
+            return queryset.favorited_by(self.request.user)
         return queryset
 
     def filter_is_in_shopping_cart(self, queryset, name, value):
         if self.request.user.is_authenticated and value:
-            return queryset.filter(recipe__user=self.request.user)
+            return queryset.in_cart_of(self.request.user)
+        return queryset
+
+    def filter_search(self, queryset, name, value):
+        if value.strip():
+            return queryset.search(value.strip())
         return queryset
+
+
+class RecipeOrderingFilter(OrderingFilter):
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if (
+            self.ordering_param not in request.query_params
+            and 'search_rank' in queryset.query.annotations
+        ):
+            return ('-search_rank', *ordering)
+        return ordering
@@ -0,0 +1,92 @@
+from collections import defaultdict
+
+from recipes.models import IngredientRecipe, Recipe, TagRecipe
+
+from .serializers import get_image_url
+
+
+def recipe_tags(recipe_ids):
+    tags = defaultdict(list)
+    for row in (
+        TagRecipe.objects.filter(recipe__in=recipe_ids)
+        .order_by('tag_id')
+        .values('recipe_id', 'tag_id', 'tag__name', 'tag__color', 'tag__slug')
+    ):
+        tags[row['recipe_id']].append(
+            {
+                'id': row['tag_id'],
+                'name': row['tag__name'],
+                'color': row['tag__color'],
+                'slug': row['tag__slug'],
+            }
+        )
+    return tags
+
+
+def recipe_ingredients(recipe_ids):
+    ingredients = defaultdict(list)
+    for row in (
+        IngredientRecipe.objects.filter(recipe__in=recipe_ids)
+        .order_by('id')
+        .values(
+            'recipe_id',
+            'ingredient_id',
+            'ingredient__name',
+            'ingredient__measurement_unit__name',
+            'amount',
+        )
+    ):
+        ingredients[row['recipe_id']].append(
+            {
+                'id': row['ingredient_id'],
+                'name': row['ingredient__name'],
+                'measurement_unit': row['ingredient__measurement_unit__name'],
+                'amount': row['amount'],
+            }
+        )
+    return ingredients
+
+
+def recipe_bodies(recipe_ids, request):
+    tags = recipe_tags(recipe_ids)
+    ingredients = recipe_ingredients(recipe_ids)
+    return [
+        {
+            'id': row['id'],
+            'tags': tags[row['id']],
+            'author': {
+                'email': row['author__email'],
+                'id': row['author_id'],
+                'username': row['author__username'],
+                'first_name': row['author__first_name'],
+                'last_name': row['author__last_name'],
+                'is_subscribed': False,
+            },
+            'ingredients': ingredients[row['id']],
+            'is_favorited': False,
+            'is_in_shopping_cart': False,
+            'name': row['name'],
+            'image': get_image_url(
+                request, row['image'], row['image_hash']
+            ),
+            'text': row['text'],
+            'cooking_time': row['cooking_time'],
+            'favorites_count': row['favorites_count'],
+            'in_carts_count': row['in_carts_count'],
+        }
+        for row in Recipe.objects.filter(pk__in=recipe_ids).values(
+            'id',
+            'name',
+            'image',
+            'image_hash',
+            'text',
+            'cooking_time',
+            'favorites_count',
+            'in_carts_count',
+            'author_id',
+            'author__email',
+            'author__username',
+            'author__first_name',
+            'author__last_name',
+        )
+    ]
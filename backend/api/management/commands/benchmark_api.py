@@ -0,0 +1,172 @@
+import json
+import math
+import statistics
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.utils import timezone
+from recipes import cookbook
+from recipes.catalog import get_catalog
+from recipes.models import Ingredient, Recipe, ShoppingListItem
+from rest_framework.test import APIClient
+from users.models import User
+
+from ...queries import QueryRecorder
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    return values[max(math.ceil(len(values) * percent / 100) - 1, 0)]
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет время ответа основных эндпоинтов API через тестовый '
+        'клиент и печатает p50/p95 и число запросов к БД в JSON, чтобы '
+        'прогоны можно было сравнивать. По умолчанию замеряется прогретый '
+        'кэш; с --cold кэш и индекс подбора рецептов сбрасываются перед '
+        'каждым запросом. Данные для замеров готовит generate_data.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument('--user', type=int, help='id пользователя')
+        parser.add_argument('--label', default='', help='метка прогона')
+        parser.add_argument('--output', help='файл для JSON')
+        parser.add_argument(
+            '--cold',
+            action='store_true',
+            help='сбрасывать кэш перед каждым запросом',
+        )
+
+    def get_user(self, user_id):
+        users = User.objects.all()
+        if user_id is not None:
+            users = users.filter(pk=user_id)
+        else:
+            users = users.filter(
+                pk__in=ShoppingListItem.objects.values('user')
+            ).annotate(subscriptions=Count('subscription')).order_by(
+                '-subscriptions'
+            )
+        user = users.first() or User.objects.first()
+        if user is None:
+            raise CommandError('В базе нет пользователей.')
+        return user
+
+    def get_endpoints(self):
+        recipe = Recipe.objects.order_by('-favorites_count').first()
+        if recipe is None:
+            raise CommandError('В базе нет рецептов.')
+        slugs = list(get_catalog().tag_ids_by_slug)
+        word = recipe.name.split()[0]
+        ingredient = Ingredient.objects.order_by('id').first()
+        ingredient_ids = ','.join(
+            str(ingredient_id)
+            for ingredient_id in Recipe.objects.filter(
+                pk=recipe.pk
+            ).values_list('ingredients', flat=True)
+        )
+        endpoints = {
+            'recipes': '/api/recipes/',
+            'recipes_page_10': '/api/recipes/?page=10',
+            'recipes_author': f'/api/recipes/?author={recipe.author_id}',
+            'recipes_favorited': '/api/recipes/?is_favorited=1',
+            'recipes_in_cart': '/api/recipes/?is_in_shopping_cart=1',
+            'recipes_search': f'/api/recipes/?search={word}',
+            'recipe_detail': f'/api/recipes/{recipe.pk}/',
+            'recipes_feed': '/api/recipes/feed/',
+            'recipes_cook': f'/api/recipes/cook/?ingredients={ingredient_ids}',
+            'subscriptions': '/api/users/subscriptions/',
+            'users': '/api/users/',
+            'shopping_cart_download': '/api/recipes/download_shopping_cart/',
+            'ingredients_search': (
+                f'/api/ingredients/?name={ingredient.name[:2]}'
+            ),
+            'ingredients_autocomplete': (
+                f'/api/ingredients/autocomplete/?name={ingredient.name[:2]}'
+            ),
+        }
+        if slugs:
+            endpoints['recipes_tags'] = '/api/recipes/?' + '&'.join(
+                f'tags={slug}' for slug in slugs[:2]
+            )
+        return endpoints
+
+    def request(self, client, url):
+        if self.cold:
+            cache.clear()
+            cookbook.invalidate()
+        with QueryRecorder() as recorder:
+            start = time.perf_counter()
+            response = client.get(url)
+            if response.streaming:
+                b''.join(response.streaming_content)
+            elapsed = time.perf_counter() - start
+        return response.status_code, elapsed, recorder.count
+
+    def measure(self, client, url, repeat, warmup):
+        for _ in range(warmup):
+            self.request(client, url)
+        statuses, timings, queries = set(), [], []
+        for _ in range(repeat):
+            status, elapsed, count = self.request(client, url)
+            statuses.add(status)
+            timings.append(elapsed * 1000)
+            queries.append(count)
+        return {
+            'url': url,
+            'status': sorted(statuses),
+            'p50_ms': round(percentile(timings, 50), 3),
+            'p95_ms': round(percentile(timings, 95), 3),
+            'mean_ms': round(statistics.mean(timings), 3),
+            'queries': max(queries),
+        }
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError('--repeat должен быть больше нуля.')
+        self.cold = options['cold']
+        if 'testserver' not in settings.ALLOWED_HOSTS:
+            settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, 'testserver']
+        user = self.get_user(options['user'])
+        client = APIClient()
+        client.force_authenticate(user)
+        anonymous = APIClient()
+        endpoints = self.get_endpoints()
+        results = {
+            name: self.measure(
+                client, url, options['repeat'], options['warmup']
+            )
+            for name, url in endpoints.items()
+        }
+        results['recipes_anonymous'] = self.measure(
+            anonymous,
+            endpoints['recipes'],
+            options['repeat'],
+            options['warmup'],
+        )
+        report = {
+            'label': options['label'],
+            'date': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'cache': 'cold' if self.cold else 'warm',
+            'repeat': options['repeat'],
+            'user': user.pk,
+            'dataset': {
+                'users': User.objects.count(),
+                'recipes': Recipe.objects.count(),
+                'ingredients': Ingredient.objects.count(),
+            },
+            'endpoints': results,
+        }
+        output = json.dumps(report, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(output)
+        self.stdout.write(output)
@@ -0,0 +1,52 @@
+import statistics
+import timeit
+
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from recipes.catalog import get_catalog
+from recipes.models import Recipe
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from ... import lean
+from ...renderers import OrjsonRenderer, orjson
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает время сериализации ответов ингредиентов и рецептов '
+        'стандартным JSONRenderer и OrjsonRenderer.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=50)
+        parser.add_argument('--recipes', type=int, default=100)
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            self.stdout.write('orjson не установлен, используется json')
+        recipe_ids = list(
+            Recipe.objects.values_list('id', flat=True)[: options['recipes']]
+        )
+        payloads = {
+            'ingredients': get_catalog().ingredient_list,
+            'recipes': lean.recipe_bodies(
+                recipe_ids, Request(RequestFactory().get('/api/recipes/'))
+            ),
+        }
+        renderers = {'json': JSONRenderer(), 'orjson': OrjsonRenderer()}
+        for payload_name, payload in payloads.items():
+            expected = renderers['json'].render(payload)
+            for renderer_name, renderer in renderers.items():
+                timings = timeit.repeat(
+                    lambda: renderer.render(payload),
+                    number=1,
+                    repeat=options['repeat'],
+                )
+                same = renderer.render(payload) == expected
+                self.stdout.write(
+                    f'{payload_name} ({len(payload)}) {renderer_name}: '
+                    f'медиана {statistics.median(timings) * 1000:.3f} мс, '
+                    f'{len(expected)} байт, '
+                    f'совпадает с json: {"да" if same else "нет"}'
+                )
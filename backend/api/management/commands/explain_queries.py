@@ -0,0 +1,167 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext
+from recipes.catalog import get_catalog
+from recipes.models import Ingredient, Recipe
+from rest_framework.test import APIClient
+from users.models import User
+
+
+def outer_query(sql):
+    depth, chars = 0, []
+    for char in sql:
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif not depth:
+            chars.append(char)
+    return ''.join(chars)
+
+
+def rowid_walk(sql, line):
+    table = line[len('SCAN '):]
+    outer = outer_query(sql)
+    return (
+        ' ' not in table
+        and ' WHERE ' not in outer
+        and ' OFFSET ' not in outer
+        and re.search(
+            rf' ORDER BY "{table}"\."id" ASC LIMIT \d+$', outer
+        ) is not None
+    )
+
+
+def seq_scans(sql, plan, vendor):
+    if vendor == 'postgresql':
+        return [line.strip() for line in plan if 'Seq Scan' in line]
+    return [
+        line
+        for line in plan
+        if line.startswith('SCAN ')
+        and ' USING INDEX ' not in line
+        and ' USING COVERING INDEX ' not in line
+        and not line.startswith(('SCAN CONSTANT', 'SCAN (', 'SCAN SUBQUERY'))
+        and not rowid_walk(sql, line)
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        'Выполняет EXPLAIN для каждого запроса к БД, который делают '
+        'основные эндпоинты API, и завершается с ошибкой, если хоть один '
+        'из них читает таблицу последовательным сканированием. Запускать '
+        'на заполненной базе (см. generate_data). На PostgreSQL план '
+        'строится с enable_seqscan = off, поэтому Seq Scan в нём означает, '
+        'что подходящего индекса нет. Запросы без WHERE (загрузка '
+        'справочников и индекса ингредиентов целиком) не проверяются. '
+        'На SQLite ограниченным считается только обход по индексу '
+        '(USING INDEX или USING COVERING INDEX) и обход первой страницы '
+        'по первичному ключу (ORDER BY id LIMIT без WHERE и OFFSET). '
+        'Поиск проверяется '
+        'только на PostgreSQL.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, help='id пользователя')
+        parser.add_argument(
+            '--verbose-plans', action='store_true', help='печатать планы'
+        )
+
+    def get_user(self, user_id):
+        users = User.objects.all()
+        if user_id is None:
+            users = users.annotate(favorites=Count('user')).order_by(
+                '-favorites'
+            )
+        else:
+            users = users.filter(pk=user_id)
+        user = users.first()
+        if user is None:
+            raise CommandError('В базе нет пользователей.')
+        return user
+
+    def get_urls(self):
+        recipe = Recipe.objects.order_by('-pub_date', '-id').first()
+        if recipe is None:
+            raise CommandError('В базе нет рецептов.')
+        slugs = list(get_catalog().tag_ids_by_slug)
+        ingredient_ids = Ingredient.objects.values_list('id', flat=True)[:3]
+        urls = [
+            '/api/recipes/',
+            f'/api/recipes/?author={recipe.author_id}',
+            '/api/recipes/?is_favorited=1',
+            '/api/recipes/?is_in_shopping_cart=1',
+            f'/api/recipes/{recipe.pk}/',
+            '/api/recipes/feed/',
+            '/api/recipes/cook/?ingredients='
+            + ','.join(map(str, ingredient_ids)),
+            '/api/recipes/download_shopping_cart/',
+            '/api/users/',
+            f'/api/users/{recipe.author_id}/',
+            '/api/users/subscriptions/',
+            '/api/users/me/',
+            '/api/tags/',
+            '/api/ingredients/?name=а',
+        ]
+        if connection.vendor == 'postgresql':
+            urls.append('/api/recipes/?search=' + recipe.name.split()[0])
+        if slugs:
+            urls += [
+                f'/api/recipes/?tags={slugs[0]}',
+                '/api/recipes/?'
+                + '&'.join(f'tags={slug}' for slug in slugs[:2])
+                + '&tags_match=all',
+            ]
+        return urls
+
+    def explain(self, sql):
+        prefix = connection.ops.explain_query_prefix()
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('SET enable_seqscan = off')
+            try:
+                cursor.execute(f'{prefix} {sql}')
+                rows = cursor.fetchall()
+            finally:
+                if connection.vendor == 'postgresql':
+                    cursor.execute('RESET enable_seqscan')
+        if connection.vendor == 'sqlite':
+            return [row[-1] for row in rows]
+        return [row[0] for row in rows]
+
+    def handle(self, *args, **options):
+        user = self.get_user(options['user'])
+        client = APIClient()
+        client.force_authenticate(user)
+        vendor = connection.vendor
+        failures = 0
+        for url in self.get_urls():
+            with CaptureQueriesContext(connection) as context:
+                response = client.get(url)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+            if response.status_code >= 400:
+                raise CommandError(f'{url}: ответ {response.status_code}')
+            for query in context.captured_queries:
+                sql = query['sql']
+                if not sql.startswith('SELECT') or ' WHERE ' not in sql:
+                    continue
+                plan = self.explain(sql)
+                scans = seq_scans(sql, plan, vendor)
+                if options['verbose_plans'] or scans:
+                    self.stdout.write(f'{url}\n  {sql}')
+                    for line in plan:
+                        self.stdout.write(f'    {line}')
+                failures += bool(scans)
+            self.stdout.write(
+                f'{url}: {len(context.captured_queries)} запросов'
+            )
+        if failures:
+            raise CommandError(
+                f'Последовательное сканирование в {failures} запросах.'
+            )
+        self.stdout.write(self.style.SUCCESS('Последовательных сканов нет.'))
@@ -0,0 +1,57 @@
+import logging
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from .queries import QueryBudgetExceeded, QueryRecorder
+
+logger = logging.getLogger(__name__)
+
+
+def get_view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return None
+    view = getattr(match.func, 'cls', None)
+    if view is None:
+        return match.view_name
+    actions = getattr(match.func, 'actions', None) or {}
+    method = request.method.lower()
+    return f'{view.__name__}.{actions.get(method, method)}'
+
+
+class QueryBudgetMiddleware:
+    def __init__(self, get_response):
+        if (
+            settings.QUERY_BUDGET_MODE == 'off'
+            and not settings.QUERY_SERVER_TIMING
+        ):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        with QueryRecorder() as recorder:
+            response = self.get_response(request)
+        if settings.QUERY_SERVER_TIMING:
+            response['Server-Timing'] = (
+                f'db;dur={recorder.duration * 1000:.1f};'
+                f'desc="{recorder.count} queries", '
+                f'total;dur={(time.perf_counter() - start) * 1000:.1f}'
+            )
+        if settings.QUERY_BUDGET_MODE != 'off':
+            self.check(request, recorder)
+        return response
+
+    def check(self, request, recorder):
+        view_name = get_view_name(request)
+        problems = recorder.problems(settings.QUERY_BUDGETS.get(view_name))
+        if not problems:
+            return
+        message = f'{request.method} {request.path} ({view_name}): ' + (
+            '; '.join(problems)
+        )
+        if settings.QUERY_BUDGET_MODE == 'raise':
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
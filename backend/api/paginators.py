@@ -1,5 +1,164 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+
+from collections import OrderedDict
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (
+    Cursor, CursorPagination, PageNumberPagination,
+)
+from rest_framework.response import Response
+
+
+class CustomCursorPaginator(CursorPagination):
+    page_size_query_param = 'limit'
+    ordering = ('-pub_date', '-id')
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if {'id', '-id', 'pk', '-pk'} & set(ordering):
+            return ordering
+        return (*ordering, '-id' if ordering[0][0] == '-' else 'id')
+
+    def get_position(self, item):
+        values = []
+        for field in self.ordering:
+            field = field.lstrip('-')
+            if isinstance(item, dict):
+                value = item[field]
+            else:
+                value = getattr(item, field)
+            if hasattr(value, 'isoformat'):
+                value = value.isoformat()
+            values.append(value)
+        return json.dumps(values)
+
+    def get_keyset(self, position, ordering):
+        try:
+            values = json.loads(position)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(ordering):
+            raise NotFound(self.invalid_cursor_message)
+        keyset = None
+        for field, value in reversed(list(zip(ordering, values))):
+            lookup = 'lt' if field[0] == '-' else 'gt'
+            field = field.lstrip('-')
+            after = Q(**{f'{field}__{lookup}': value})
+            if keyset is not None:
+                after |= Q(**{field: value}) & keyset
+            keyset = after
+        field = ordering[0]
+        lookup = 'lte' if field[0] == '-' else 'gte'
+        return Q(**{f'{field.lstrip("-")}__{lookup}': values[0]}) & keyset
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        self.ordering = self.get_ordering(request, queryset, view)
+        cursor = self.decode_cursor(request)
+        reverse = cursor is not None and cursor.reverse
+        ordering = self.ordering
+        if reverse:
+            ordering = tuple(
+                field[1:] if field[0] == '-' else f'-{field}'
+                for field in ordering
+            )
+        queryset = queryset.order_by(*ordering)
+        if cursor is not None and cursor.position is not None:
+            queryset = queryset.filter(
+                self.get_keyset(cursor.position, ordering)
+            )
+        page = list(queryset[:self.page_size + 1])
+        has_more = len(page) > self.page_size
+        page = page[:self.page_size]
+        if reverse:
+            page.reverse()
+            self.has_previous, self.has_next = has_more, bool(page)
+        else:
+            self.has_previous = cursor is not None and bool(page)
+            self.has_next = has_more
+        if page:
+            self.previous_position = self.get_position(page[0])
+            self.next_position = self.get_position(page[-1])
+        return page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(
+            Cursor(offset=0, reverse=False, position=self.next_position)
+        )
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        return self.encode_cursor(
+            Cursor(offset=0, reverse=True, position=self.previous_position)
+        )
 
 
 class CustomPaginator(PageNumberPagination):
     page_size_query_param = 'limit'
+    cursor_paginator_class = CustomCursorPaginator
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_paginator = None
+        if self.cursor_paginator_class.cursor_query_param in (
+            request.query_params
+        ):
+            self.cursor_paginator = self.cursor_paginator_class()
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view
+            )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class FeedPaginator(CustomCursorPaginator):
+    def paginate_feed(self, fetch, request):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        before = None
+        cursor = self.decode_cursor(request)
+        if cursor is not None:
+            pub_date, _, recipe_id = (cursor.position or '').partition('|')
+            pub_date = parse_datetime(pub_date)
+            if pub_date is None or not recipe_id.isdigit():
+                raise NotFound(self.invalid_cursor_message)
+            before = (pub_date, int(recipe_id))
+
+        entries = fetch(before, self.page_size + 1)
+        self.has_next = len(entries) > self.page_size
+        entries = entries[:self.page_size]
+        if self.has_next:
+            pub_date, recipe_id = entries[-1]
+            self.next_position = f'{pub_date.isoformat()}|{recipe_id}'
+        return entries
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(
+            Cursor(offset=0, reverse=False, position=self.next_position)
+        )
+
+    def get_paginated_response(self, data):
+        return Response(
+            OrderedDict(
+                [
+                    ('next', self.get_next_link()),
+                    ('previous', None),
+                    ('results', data),
+                ]
+            )
+        )
@@ -0,0 +1,78 @@
+import re
+import time
+
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+PLACEHOLDER = re.compile(r"%s|'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+IN_LIST = re.compile(r'\bIN \(\?(?:, \?)*\)')
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def fingerprint(sql):
+    return IN_LIST.sub('IN (...)', PLACEHOLDER.sub('?', sql))
+
+
+class QueryRecorder:
+    def __init__(self):
+        self.queries = []
+        self._stack = None
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.perf_counter() - start))
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for connection in connections.all():
+            self._stack.enter_context(connection.execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stack.close()
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def duration(self):
+        return sum(duration for _, duration in self.queries)
+
+    def repeated(self, threshold):
+        fingerprints = Counter(fingerprint(sql) for sql, _ in self.queries)
+        return [
+            (sql, count)
+            for sql, count in fingerprints.most_common()
+            if count >= threshold
+        ]
+
+    def problems(self, budget=None, threshold=None):
+        if threshold is None:
+            threshold = settings.N_PLUS_ONE_THRESHOLD
+        problems = []
+        if budget is not None and self.count > budget:
+            problems.append(f'{self.count} запросов при бюджете {budget}')
+        problems += [
+            f'N+1: {count} раз {sql}'
+            for sql, count in self.repeated(threshold)
+        ]
+        return problems
+
+
+@contextmanager
+def query_budget(budget=None, threshold=None):
+    with QueryRecorder() as recorder:
+        yield recorder
+    problems = recorder.problems(budget, threshold)
+    if problems:
+        raise QueryBudgetExceeded('\n'.join(problems))
@@ -0,0 +1,117 @@
+import csv
+import io
+import json
+import os
+
+from django.conf import settings
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    from reportlab.pdfgen import canvas
+except ImportError:
+    canvas = None
+
+NAME = 'ingredient__name'
+UNIT = 'ingredient__measurement_unit__name'
+TOTAL = 'total'
+
+
+class OrjsonRenderer(JSONRenderer):
+    encoder = JSONEncoder()
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or self.get_indent(
+            accepted_media_type, renderer_context or {}
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b''
+        ret = orjson.dumps(
+            data,
+            default=self.encoder.default,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME,
+        )
+        return ret.replace('\u2028'.encode(), b'\\u2028').replace(
+            '\u2029'.encode(), b'\\u2029'
+        )
+
+
+class ShoppingCartRenderer(BaseRenderer):
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data, ensure_ascii=False).encode(self.charset)
+
+    def stream(self, items):
+        for item in items:
+            line = f'{item[NAME]} - {item[TOTAL]} {item[UNIT]}\n'
+            yield line.encode(self.charset)
+
+
+class TextShoppingCartRenderer(ShoppingCartRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+class CsvShoppingCartRenderer(ShoppingCartRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def stream(self, items):
+        writer = csv.writer(Echo())
+        yield writer.writerow(('Ингредиент', 'Количество', 'Ед. измерения'))
+        for item in items:
+            yield writer.writerow((item[NAME], item[TOTAL], item[UNIT]))
+
+
+class PdfShoppingCartRenderer(ShoppingCartRenderer):
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+    font_name = 'ShoppingCartFont'
+    font_size = 12
+    margin = 50
+
+    def stream(self, items):
+        if self.font_name not in pdfmetrics.getRegisteredFontNames():
+            pdfmetrics.registerFont(
+                TTFont(self.font_name, settings.SHOPPING_CART_PDF_FONT)
+            )
+        buffer = io.BytesIO()
+        document = canvas.Canvas(buffer, pagesize=A4)
+        width, height = A4
+        y = height - self.margin
+        document.setFont(self.font_name, self.font_size)
+        for item in items:
+            if y < self.margin:
+                document.showPage()
+                document.setFont(self.font_name, self.font_size)
+                y = height - self.margin
+            document.drawString(
+                self.margin, y, f'{item[NAME]} - {item[TOTAL]} {item[UNIT]}'
+            )
+            y -= self.font_size * 1.5
+        document.save()
+        yield buffer.getvalue()
+
+
+SHOPPING_CART_RENDERERS = (
+    TextShoppingCartRenderer,
+    CsvShoppingCartRenderer,
+)
+if canvas is not None and os.path.isfile(settings.SHOPPING_CART_PDF_FONT):
+    SHOPPING_CART_RENDERERS += (PdfShoppingCartRenderer,)
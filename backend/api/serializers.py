@@ -1,9 +1,14 @@
+from collections import defaultdict
+
+from django.conf import settings
 from django.db import transaction
 from djoser.serializers import UserCreateSerializer, UserSerializer
 from drf_extra_fields.fields import Base64ImageField
+from recipes import catalog, images
+from recipes.catalog import get_catalog
 from recipes.models import (
-    Favorite, Ingredient, IngredientRecipe, Recipe, ShoppingСart, Subscription,
-    Tag, TagRecipe, User,
+    Favorite, Ingredient, IngredientRecipe, Recipe, ShoppingListItem,
+    ShoppingСart, Subscription, Tag, TagRecipe, User,
 )
 from rest_framework import exceptions, serializers
 
@@ -39,6 +44,8 @@ class CustomUserSerializer(UserSerializer):
         )
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         user = self.context['request'].user
         if user.is_authenticated:
             return Subscription.objects.filter(
@@ -104,15 +111,58 @@ class AuthorRecipeSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit', 'amount')
 
 
-class FilteredRecipeInListSerializer(serializers.ListSerializer):
-    def to_representation(self, data):
-        recipes_limit = self.context['request'].query_params.get(
-            'recipes_limit'
-        )
-        if recipes_limit and recipes_limit.isdigit():
-            data = data.all()[: int(recipes_limit)]
-        return super(FilteredRecipeInListSerializer, self).to_representation(
-            data
+def get_recipes_limit(request):
+    recipes_limit = request.query_params.get('recipes_limit')
+    if recipes_limit and recipes_limit.isdigit():
+        return int(recipes_limit)
+    return None
+
+
+def get_image_variant(request):
+    size = request.query_params.get('image_size')
+    if size not in images.RENDITIONS:
+        return None
+    image_format = request.query_params.get('image_format')
+    if image_format not in images.FORMATS:
+        image_format = 'jpeg'
+    return size, image_format
+
+
+def get_image_url(request, name, image_hash):
+    image_url = images.image_url(name, image_hash, get_image_variant(request))
+    if image_url is None:
+        return None
+    return request.build_absolute_uri(image_url)
+
+
+class RecipeImageField(Base64ImageField):
+    def to_internal_value(self, data):
+        return images.run(self.decode, data)
+
+    def decode(self, data):
+        if data in self.EMPTY_VALUES:
+            return None
+        max_size = settings.RECIPE_UPLOAD_MAX_SIZE
+        if isinstance(data, str):
+            try:
+                data = images.decode_base64(data, max_size)
+            except images.ImageTooLarge:
+                raise exceptions.ValidationError(
+                    f'Картинка больше {max_size} байт.'
+                )
+            except ValueError:
+                raise exceptions.ValidationError(self.INVALID_FILE_MESSAGE)
+        elif getattr(data, 'size', 0) > max_size:
+            raise exceptions.ValidationError(
+                f'Картинка больше {max_size} байт.'
+            )
+
+        extension = images.image_extension(data)
+        if extension not in self.ALLOWED_TYPES:
+            raise exceptions.ValidationError(self.INVALID_TYPE_MESSAGE)
+        data.name = f'{self.get_file_name(data)}.{extension}'
+        return images.cap_size(
+            serializers.ImageField.to_internal_value(self, data)
         )
 
 
@@ -120,22 +170,31 @@ class RecipeInListSerializer(serializers.ModelSerializer):
     image = serializers.SerializerMethodField()
 
     class Meta:
-        list_serializer_class = FilteredRecipeInListSerializer
         model = Recipe
         fields = ('id', 'name', 'image', 'cooking_time')
 
     def get_image(self, obj):
-        request = self.context.get('request')
-        image_url = obj.image.url
-        return request.build_absolute_uri(image_url)
+        return get_image_url(
+            self.context.get('request'), obj.image.name, obj.image_hash
+        )
+
+
+class CatalogTagField(serializers.PrimaryKeyRelatedField):
+    def to_internal_value(self, data):
+        if isinstance(data, bool) or not str(data).isdigit():
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        tag = get_catalog().tags.get(int(data))
+        if tag is None:
+            self.fail('does_not_exist', pk_value=data)
+        return Tag.from_db(
+            self.get_queryset().db, list(tag.keys()), list(tag.values())
+        )
 
 
 class RecipeWriteSerializer(serializers.ModelSerializer):
-    image = Base64ImageField()
+    image = RecipeImageField()
     ingredients = IngredientRecipeWriteSerializer(many=True)
-    tags = serializers.PrimaryKeyRelatedField(
-        many=True, queryset=Tag.objects.all()
-    )
+    tags = CatalogTagField(many=True, queryset=Tag.objects.all())
     author = serializers.PrimaryKeyRelatedField(
         read_only=True, default=serializers.CurrentUserDefault()
     )
@@ -163,23 +222,48 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
             raise exceptions.ValidationError(
                 'В рецепте должны быть ингредиенты.'
             )
-        for id in ingredients_id:
-            if not Ingredient.objects.filter(pk=id).exists():
-                raise exceptions.ValidationError(
-                    'Такой ингредиент не существует.'
-                )
+        existing = get_catalog().ingredients
+        missing = [id for id in ingredients_id if id not in existing]
+        if missing:
+            raise exceptions.ValidationError(
+                'Такие ингредиенты не существуют: '
+                + ', '.join(str(id) for id in missing)
+                + '.'
+            )
 
         return data
 
+    def lock_catalog_rows(self, ingredients, tags):
+        for model, ids, message in (
+            (
+                Ingredient,
+                {ingredient.get('id') for ingredient in ingredients},
+                'Такие ингредиенты не существуют: ',
+            ),
+            (Tag, {tag.id for tag in tags}, 'Такие теги не существуют: '),
+        ):
+            missing = ids - set(
+                model.objects.filter(pk__in=ids)
+                .select_for_update(no_key=True)
+                .values_list('pk', flat=True)
+            )
+            if missing:
+                catalog.invalidate()
+                raise exceptions.ValidationError(
+                    message + ', '.join(map(str, sorted(missing))) + '.'
+                )
+
     @transaction.atomic
     def create(self, validated_data):
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
+        self.lock_catalog_rows(ingredients, tags)
         recipe = Recipe.objects.create(**validated_data)
+        images.schedule_renditions(recipe)
 
         objs_ingredients = [
             IngredientRecipe(
-                ingredient=Ingredient.objects.get(pk=ingredient.get('id')),
+                ingredient_id=ingredient.get('id'),
                 amount=ingredient.get('amount'),
                 recipe=recipe,
             )
@@ -189,35 +273,87 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
 
         objs_tags = [TagRecipe(tag=tag, recipe=recipe) for tag in tags]
         TagRecipe.objects.bulk_create(objs_tags)
+        Recipe.objects.filter(pk=recipe.pk).update_search_vector()
 
         return recipe
 
+    def update_ingredients(self, instance, ingredients):
+        amounts = {
+            ingredient.get('id'): ingredient.get('amount')
+            for ingredient in ingredients
+        }
+        current = {
+            row.ingredient_id: row
+            for row in instance.ingredientrecipe_recipes.all()
+        }
+        removed = current.keys() - amounts.keys()
+        changed = [
+            row
+            for id, row in current.items()
+            if id in amounts and row.amount != amounts[id]
+        ]
+        for row in changed:
+            row.amount = amounts[row.ingredient_id]
+        added = [
+            IngredientRecipe(ingredient_id=id, amount=amount, recipe=instance)
+            for id, amount in amounts.items()
+            if id not in current
+        ]
+
+        if removed:
+            instance.ingredientrecipe_recipes.filter(
+                ingredient__in=removed
+            ).delete()
+        if changed:
+            IngredientRecipe.objects.bulk_update(changed, ['amount'])
+        if added:
+            IngredientRecipe.objects.bulk_create(added)
+
+        return [
+            *removed,
+            *(row.ingredient_id for row in changed),
+            *(row.ingredient_id for row in added),
+        ]
+
     @transaction.atomic
     def update(self, instance, validated_data):
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
+        self.lock_catalog_rows(ingredients, tags)
 
-        instance.tags.clear()
-        instance.ingredients.clear()
-
-        for ingredient in ingredients:
-            id = ingredient.get('id')
-            amount = ingredient.get('amount')
-            obj = Ingredient.objects.get(pk=id)
-            instance.ingredients.add(obj, through_defaults={'amount': amount})
+        touched_ingredients = self.update_ingredients(instance, ingredients)
 
         instance.name = validated_data.get('name', instance.name)
         instance.text = validated_data.get('text', instance.text)
         instance.cooking_time = validated_data.get(
             'cooking_time', instance.cooking_time
         )
+        old_image = instance.image.name
         instance.image = validated_data.get('image', instance.image)
-        instance.tags.add(*tags)
+        instance.tags.set(tags)
         instance.save()
+        image_changed = instance.image.name != old_image
+        Recipe.objects.filter(pk=instance.pk).touch(
+            **({'image_hash': ''} if image_changed else {})
+        )
+        if image_changed:
+            images.schedule_renditions(instance)
+
+        if touched_ingredients:
+            ShoppingListItem.objects.refresh(
+                ShoppingСart.objects.filter(recipe=instance).values('user'),
+                touched_ingredients,
+            )
 
         return instance
 
     def to_representation(self, instance):
+        user = self.context['request'].user
+        instance = (
+            Recipe.objects.with_user_flags(user)
+            .with_related(user)
+            .get(pk=instance.pk)
+        )
         return RecipeReadSerializer(instance, context=self.context).data
 
 
@@ -230,6 +366,7 @@ class RecipeReadSerializer(serializers.ModelSerializer):
     )
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
+    image = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
@@ -244,15 +381,26 @@ class RecipeReadSerializer(serializers.ModelSerializer):
             'image',
             'text',
             'cooking_time',
+            'favorites_count',
+            'in_carts_count',
+        )
+
+    def get_image(self, obj):
+        return get_image_url(
+            self.context['request'], obj.image.name, obj.image_hash
         )
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         user = self.context['request'].user
         if user.is_authenticated:
             return Favorite.objects.filter(recipe=obj.id, user=user).exists()
         return False
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         user = self.context['request'].user
         if user.is_authenticated:
             return ShoppingСart.objects.filter(
@@ -261,13 +409,27 @@ class RecipeReadSerializer(serializers.ModelSerializer):
         return False
 
 
+class SubscribeListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        recipes_limit = get_recipes_limit(self.context['request'])
+        recipes = Recipe.objects.latest_by_author(
+            [author.id for author in data], recipes_limit
+        )
+        recipes_by_author = defaultdict(list)
+        for recipe in recipes:
+            recipes_by_author[recipe.author_id].append(recipe)
+        for author in data:
+            author.recipes_preview = recipes_by_author[author.id]
+        return super().to_representation(data)
+
+
 class SubscribeSerializer(serializers.ModelSerializer):
 
     is_subscribed = serializers.SerializerMethodField()
-    recipes = RecipeInListSerializer(many=True, read_only=True)
-    recipes_count = serializers.SerializerMethodField()
+    recipes = serializers.SerializerMethodField()
 
     class Meta:
+        list_serializer_class = SubscribeListSerializer
         model = User
         fields = (
             'email',
@@ -281,6 +443,8 @@ class SubscribeSerializer(serializers.ModelSerializer):
         )
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         user = self.context['request'].user
         if user.is_authenticated:
             return Subscription.objects.filter(
@@ -288,5 +452,13 @@ class SubscribeSerializer(serializers.ModelSerializer):
             ).exists()
         return False
 
-    def get_recipes_count(self, obj):
-        return obj.recipes.count()
+    def get_recipes(self, obj):
+        if hasattr(obj, 'recipes_preview'):
+            recipes = obj.recipes_preview
+        else:
+            recipes = obj.recipes.all()[
+                :get_recipes_limit(self.context['request'])
+            ]
+        return RecipeInListSerializer(
+            recipes, many=True, context=self.context
+        ).data
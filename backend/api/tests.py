@@ -0,0 +1,802 @@
+import base64
+import csv
+import datetime
+import decimal
+import io
+import json
+import re
+import shutil
+import tempfile
+import uuid
+
+from types import SimpleNamespace
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.admin import site
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import FloatField
+from django.db.models.functions import Cast
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from recipes import catalog, feed, images
+from recipes.admin import RecipeAdmin
+from recipes.models import (
+    Favorite, Ingredient, IngredientRecipe, Recipe, RecipeQuerySet,
+    ShoppingListItem, ShoppingСart, Subscription, Tag, TagRecipe, Unit,
+)
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient
+from users.models import User
+
+from . import caching, lean
+from .management.commands.explain_queries import seq_scans
+from .middleware import get_view_name
+from .paginators import CustomCursorPaginator
+from .parsers import OrjsonParser
+from .queries import QueryBudgetExceeded, fingerprint, query_budget
+from .renderers import OrjsonRenderer
+from .serializers import RecipeReadSerializer
+from .views import RecipeViewSet
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def make_png():
+    buffer = io.BytesIO()
+    Image.new('RGB', (1, 1)).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+PNG = make_png()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class RecipeDataTestCase(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [
+            User.objects.create(
+                username=f'user{number}',
+                email=f'user{number}@example.com',
+                first_name='Имя',
+                last_name='Фамилия',
+            )
+            for number in range(3)
+        ]
+        unit = Unit.objects.create(name='г')
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'ингредиент {number}', measurement_unit=unit
+            )
+            for number in range(6)
+        ]
+        cls.tags = [
+            Tag.objects.create(
+                name=f'тэг {number}',
+                slug=f'tag{number}',
+                color=f'#00000{number}',
+            )
+            for number in range(3)
+        ]
+        cls.recipes = []
+        for number in range(6):
+            recipe = Recipe.objects.create(
+                author=cls.users[number % 2],
+                name=f'рецепт {number}',
+                text='описание',
+                cooking_time=number + 1,
+                image=ContentFile(PNG, name='image.png'),
+            )
+            IngredientRecipe.objects.bulk_create(
+                IngredientRecipe(
+                    recipe=recipe,
+                    ingredient=cls.ingredients[(number + shift) % 6],
+                    amount=shift + 1,
+                )
+                for shift in range(3)
+            )
+            TagRecipe.objects.create(recipe=recipe, tag=cls.tags[number % 3])
+            cls.recipes.append(recipe)
+        reader = cls.users[2]
+        Favorite.objects.create(user=reader, recipe=cls.recipes[0])
+        ShoppingСart.objects.create(user=reader, recipe=cls.recipes[1])
+        Subscription.objects.create(user=reader, author=cls.users[0])
+
+    def setUp(self):
+        cache.clear()
+        catalog.invalidate()
+        catalog.get_catalog()
+
+    def client_for(self, user=None):
+        client = APIClient()
+        if user is not None:
+            client.force_authenticate(user)
+        return client
+
+
+class RecipeListQueriesTest(RecipeDataTestCase):
+    def assert_list_queries(self, client, number):
+        for limit in (1, 6):
+            cache.clear()
+            catalog.get_catalog()
+            with self.assertNumQueries(number):
+                response = client.get(f'/api/recipes/?limit={limit}')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data['results']), limit)
+
+    def test_anonymous_list_queries(self):
+        self.assert_list_queries(self.client_for(), 5)
+
+    def test_authenticated_list_queries(self):
+        self.assert_list_queries(self.client_for(self.users[2]), 5)
+
+    def test_authenticated_list_with_cached_bodies(self):
+        client = self.client_for(self.users[2])
+        client.get('/api/recipes/?limit=6')
+        with self.assertNumQueries(2):
+            response = client.get('/api/recipes/?limit=6')
+        flags = {
+            recipe['id']: (
+                recipe['is_favorited'],
+                recipe['is_in_shopping_cart'],
+                recipe['author']['is_subscribed'],
+            )
+            for recipe in response.data['results']
+        }
+        self.assertEqual(flags[self.recipes[0].pk], (True, False, True))
+        self.assertEqual(flags[self.recipes[1].pk], (False, True, False))
+
+    def test_anonymous_cached_list_has_no_queries(self):
+        client = self.client_for()
+        client.get('/api/recipes/')
+        with self.assertNumQueries(0):
+            self.assertEqual(client.get('/api/recipes/').status_code, 200)
+
+
+class SubscriptionsTest(RecipeDataTestCase):
+    def test_empty_page_with_recipes_limit(self):
+        response = self.client_for(self.users[1]).get(
+            '/api/users/subscriptions/?recipes_limit=3'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'], [])
+
+    def test_recipes_limit_preview(self):
+        response = self.client_for(self.users[2]).get(
+            '/api/users/subscriptions/?recipes_limit=2'
+        )
+        self.assertEqual(response.status_code, 200)
+        [author] = response.data['results']
+        self.assertEqual(author['id'], self.users[0].pk)
+        self.assertTrue(author['is_subscribed'])
+        self.assertEqual(len(author['recipes']), 2)
+
+
+class FeedTest(RecipeDataTestCase):
+    def test_feed_is_one_keyset_query(self):
+        reader = self.users[2]
+        Subscription.objects.create(user=reader, author=self.users[1])
+        entries = []
+        before = None
+        while True:
+            with CaptureQueriesContext(connection) as context:
+                page = feed.merge(reader, before, 2)
+            self.assertEqual(len(context.captured_queries), 1)
+            self.assertNotIn('UNION', context.captured_queries[0]['sql'])
+            if not page:
+                break
+            entries += page
+            before = page[-1]
+        self.assertEqual(
+            [recipe_id for _, recipe_id in entries],
+            [recipe.pk for recipe in reversed(self.recipes)],
+        )
+
+    @override_settings(FEED_CACHE_TIMEOUT=0)
+    def test_feed_pages(self):
+        client = self.client_for(self.users[2])
+        url = '/api/recipes/feed/?limit=2'
+        ids = []
+        while url:
+            response = client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids += [recipe['id'] for recipe in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(
+            ids, [self.recipes[number].pk for number in (4, 2, 0)]
+        )
+
+
+class CursorPaginationTest(RecipeDataTestCase):
+    def walk(self, client, url):
+        pages = []
+        while url:
+            with CaptureQueriesContext(connection) as context:
+                response = client.get(url)
+            self.assertEqual(response.status_code, 200)
+            for query in context.captured_queries:
+                self.assertNotIn('OFFSET', query['sql'])
+            pages.append(response.data)
+            url = response.data['next']
+        return pages
+
+    def test_keyset_over_equal_pub_dates(self):
+        Recipe.objects.update(pub_date=self.recipes[0].pub_date)
+        client = self.client_for(self.users[2])
+        pages = self.walk(client, '/api/recipes/?limit=4&cursor=')
+        self.assertEqual(
+            [recipe['id'] for page in pages for recipe in page['results']],
+            [recipe.pk for recipe in reversed(self.recipes)],
+        )
+        response = client.get(pages[-1]['previous'])
+        self.assertEqual(response.data['results'], pages[0]['results'])
+        self.assertIsNone(response.data['previous'])
+
+    def test_keyset_over_custom_ordering(self):
+        Recipe.objects.update(favorites_count=1)
+        pages = self.walk(
+            self.client_for(),
+            '/api/recipes/?limit=4&ordering=favorites_count&cursor=',
+        )
+        self.assertEqual(
+            [recipe['id'] for page in pages for recipe in page['results']],
+            [recipe.pk for recipe in self.recipes],
+        )
+
+
+class RankedCursorTest(RecipeDataTestCase):
+    def test_cursor_over_search_rank(self):
+        for recipe, cooking_time in zip(self.recipes, (3, 6, 3, 5, 2, 4)):
+            Recipe.objects.filter(pk=recipe.pk).update(
+                cooking_time=cooking_time
+            )
+        versions = Recipe.objects.annotate(
+            search_rank=Cast('cooking_time', FloatField())
+        ).versions(AnonymousUser())
+        view = RecipeViewSet()
+        ids, url = [], '/api/recipes/?limit=2'
+        while url:
+            request = Request(RequestFactory().get(url))
+            paginator = CustomCursorPaginator()
+            page = paginator.paginate_queryset(versions, request, view)
+            ids += [version['id'] for version in page]
+            url = paginator.get_next_link()
+        self.assertEqual(
+            ids, [self.recipes[number].pk for number in (1, 3, 5, 2, 0, 4)]
+        )
+
+
+class AnonymousCacheTest(RecipeDataTestCase):
+    def names(self, url):
+        response = self.client_for().get(url)
+        self.assertEqual(response.status_code, 200)
+        return {recipe['name'] for recipe in response.data['results']}
+
+    def test_author_param_is_normalized(self):
+        recipe = self.recipes[0]
+        url = f'/api/recipes/?author=0{recipe.author_id}'
+        self.assertIn(recipe.name, self.names(url))
+        with self.captureOnCommitCallbacks(execute=True):
+            Recipe.objects.filter(pk=recipe.pk).touch(name='новое название')
+            caching.invalidate_recipe(recipe.pk, recipe.author_id)
+        self.assertIn('новое название', self.names(url))
+
+    def test_admin_edit_refreshes_cached_bodies(self):
+        recipe = self.recipes[0]
+        urls = [
+            '/api/recipes/?limit=6',
+            f'/api/recipes/?author={recipe.author_id}',
+        ]
+        for url in urls:
+            self.assertIn(recipe.name, self.names(url))
+        response = self.client_for().get(f'/api/recipes/{recipe.pk}/')
+        self.assertEqual(response.data['name'], recipe.name)
+        recipe.name = 'новое название'
+        request = RequestFactory().post('/admin/')
+        with self.captureOnCommitCallbacks(execute=True):
+            RecipeAdmin(Recipe, site).save_model(
+                request, recipe, SimpleNamespace(changed_data=['name']), True
+            )
+        for url in urls:
+            self.assertIn('новое название', self.names(url))
+        response = self.client_for().get(f'/api/recipes/{recipe.pk}/')
+        self.assertEqual(response.data['name'], 'новое название')
+
+    def test_renditions_refresh_cached_lists(self):
+        recipe = self.recipes[0]
+        url = '/api/recipes/?limit=6&image_size=thumbnail'
+
+        def image():
+            response = self.client_for().get(url)
+            return next(
+                item['image']
+                for item in response.data['results']
+                if item['id'] == recipe.pk
+            )
+
+        before = image()
+        with self.captureOnCommitCallbacks(execute=True):
+            image_hash = images.build_renditions(recipe.pk, recipe.image.name)
+        self.assertNotEqual(image(), before)
+        self.assertIn(image_hash, image())
+
+    def test_admin_delete_invalidates_lists(self):
+        recipe = self.recipes[0]
+        urls = [
+            '/api/recipes/?limit=6',
+            f'/api/recipes/?author={recipe.author_id}',
+        ]
+        for url in urls:
+            self.assertIn(recipe.name, self.names(url))
+        request = RequestFactory().post('/admin/')
+        with self.captureOnCommitCallbacks(execute=True):
+            RecipeAdmin(Recipe, site).delete_model(request, recipe)
+        for url in urls:
+            self.assertNotIn(recipe.name, self.names(url))
+
+
+class ShoppingCartDownloadTest(RecipeDataTestCase):
+    def download(self, client, format, media_type):
+        response = client.get(
+            f'/api/recipes/download_shopping_cart/?format={format}'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith(media_type))
+        return b''.join(response.streaming_content).decode()
+
+    def test_download_formats(self):
+        Ingredient.objects.filter(pk=self.ingredients[4].pk).update(
+            measurement_unit=Unit.objects.create(name='шт.')
+        )
+        client = self.client_for(self.users[1])
+        for recipe in self.recipes[2:4]:
+            client.post(f'/api/recipes/{recipe.pk}/shopping_cart/')
+        expected = [
+            ['ингредиент 2', '1', 'г'],
+            ['ингредиент 3', '3', 'г'],
+            ['ингредиент 4', '5', 'шт.'],
+            ['ингредиент 5', '3', 'г'],
+        ]
+        self.assertEqual(
+            self.download(client, 'txt', 'text/plain').splitlines(),
+            [f'{name} - {amount} {unit}' for name, amount, unit in expected],
+        )
+        self.assertEqual(
+            list(
+                csv.reader(
+                    io.StringIO(self.download(client, 'csv', 'text/csv'))
+                )
+            ),
+            [['Ингредиент', 'Количество', 'Ед. измерения'], *expected],
+        )
+
+    def test_shared_ingredient_totals(self):
+        client = self.client_for(self.users[1])
+        for recipe in self.recipes[2:4]:
+            client.post(f'/api/recipes/{recipe.pk}/shopping_cart/')
+        totals = dict(
+            ShoppingListItem.objects.filter(user=self.users[1]).values_list(
+                'ingredient__name', 'amount'
+            )
+        )
+        self.assertEqual(totals['ингредиент 3'], 2 + 1)
+        self.assertEqual(totals['ингредиент 4'], 3 + 2)
+        client.delete(f'/api/recipes/{self.recipes[2].pk}/shopping_cart/')
+        totals = dict(
+            ShoppingListItem.objects.filter(user=self.users[1]).values_list(
+                'ingredient__name', 'amount'
+            )
+        )
+        self.assertNotIn('ингредиент 2', totals)
+        self.assertEqual(totals['ингредиент 3'], 1)
+
+
+class CountersTest(RecipeDataTestCase):
+    def test_removing_rows_created_outside_api(self):
+        client = self.client_for(self.users[2])
+        recipe = self.recipes[0]
+        response = client.delete(f'/api/recipes/{recipe.pk}/favorite/')
+        self.assertEqual(response.status_code, 204)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.favorites_count, 0)
+
+        response = client.delete(f'/api/users/{self.users[0].pk}/subscribe/')
+        self.assertEqual(response.status_code, 204)
+        self.users[0].refresh_from_db()
+        self.assertEqual(self.users[0].followers_count, 0)
+
+        response = self.client_for(self.users[0]).delete(
+            f'/api/recipes/{recipe.pk}/'
+        )
+        self.assertEqual(response.status_code, 204)
+        self.users[0].refresh_from_db()
+        self.assertEqual(self.users[0].recipes_count, 0)
+
+
+class RecipeUpdateTest(RecipeDataTestCase):
+    def test_update_touches_recipe_once(self):
+        recipe = self.recipes[0]
+        client = self.client_for(recipe.author)
+        with query_budget(threshold=3):
+            response = client.patch(
+                f'/api/recipes/{recipe.pk}/',
+                {
+                    'ingredients': [
+                        {'id': ingredient.pk, 'amount': 5}
+                        for ingredient in self.ingredients[3:]
+                    ],
+                    'tags': [self.tags[1].pk, self.tags[2].pk],
+                    'name': 'новое название',
+                    'text': 'описание',
+                    'cooking_time': 10,
+                },
+                format='json',
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            Recipe.objects.get(pk=recipe.pk).revision, recipe.revision + 1
+        )
+        self.assertEqual(
+            sorted(item['id'] for item in response.data['ingredients']),
+            [ingredient.pk for ingredient in self.ingredients[3:]],
+        )
+
+    def test_update_with_ingredient_deleted_elsewhere(self):
+        ingredient = Ingredient.objects.create(
+            name='удалённый',
+            measurement_unit=self.ingredients[0].measurement_unit,
+        )
+        catalog.invalidate()
+        catalog.get_catalog()
+        Ingredient.objects.filter(pk=ingredient.pk).delete()
+        recipe = self.recipes[0]
+        response = self.client_for(recipe.author).patch(
+            f'/api/recipes/{recipe.pk}/',
+            {
+                'ingredients': [{'id': ingredient.pk, 'amount': 1}],
+                'tags': [self.tags[0].pk],
+                'name': 'новое название',
+                'text': 'описание',
+                'cooking_time': 10,
+            },
+            format='json',
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertNotIn(ingredient.pk, catalog.get_catalog().ingredients)
+
+    def test_create_updates_search_vector_once(self):
+        client = self.client_for(self.users[0])
+        with mock.patch.object(
+            RecipeQuerySet, 'update_search_vector', autospec=True
+        ) as update_search_vector:
+            response = client.post(
+                '/api/recipes/',
+                {
+                    'ingredients': [
+                        {'id': self.ingredients[0].pk, 'amount': 1}
+                    ],
+                    'tags': [self.tags[0].pk],
+                    'image': 'data:image/png;base64,'
+                    + base64.b64encode(PNG).decode(),
+                    'name': 'новый рецепт',
+                    'text': 'описание',
+                    'cooking_time': 10,
+                },
+                format='json',
+            )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(update_search_vector.call_count, 1)
+
+    def test_admin_bulk_delete_touches_recipe_once(self):
+        recipe = self.recipes[0]
+        admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password'
+        )
+        self.client.force_login(admin)
+        rows = IngredientRecipe.objects.filter(recipe=recipe)
+        response = self.client.post(
+            '/admin/recipes/ingredientrecipe/',
+            {
+                'action': 'delete_selected',
+                'post': 'yes',
+                '_selected_action': list(rows.values_list('pk', flat=True)),
+            },
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(rows.exists())
+        self.assertEqual(
+            Recipe.objects.get(pk=recipe.pk).revision, recipe.revision + 1
+        )
+
+
+@override_settings(LEAN_READ_VIEWS=['RecipeViewSet'])
+class LeanParityTest(RecipeDataTestCase):
+    variant = '?image_size=thumbnail&image_format=webp'
+
+    def render(self, data):
+        return OrjsonRenderer().render(data)
+
+    def make_request(self, query='', user=None):
+        request = Request(RequestFactory().get('/api/recipes/' + query))
+        request.user = user or AnonymousUser()
+        return request
+
+    def serialized(self, request):
+        recipes = (
+            Recipe.objects.with_user_flags(request.user)
+            .with_related(request.user)
+            .order_by('-pub_date', '-id')
+        )
+        return RecipeReadSerializer(
+            recipes, many=True, context={'request': request}
+        ).data
+
+    def assert_bodies_match(self, query=''):
+        request = self.make_request(query)
+        expected = self.serialized(request)
+        bodies = {
+            body['id']: body
+            for body in lean.recipe_bodies(
+                [recipe['id'] for recipe in expected], request
+            )
+        }
+        self.assertEqual(
+            self.render([bodies[recipe['id']] for recipe in expected]),
+            self.render(expected),
+        )
+
+    def assert_responses_match(self, user, query=''):
+        client = self.client_for(user)
+        separator = '&' if query else '?'
+        response = client.get(f'/api/recipes/{query}{separator}limit=6')
+        self.assertEqual(response.status_code, 200)
+        expected = self.serialized(self.make_request(query, user))
+        self.assertEqual(
+            self.render(response.data['results']), self.render(expected)
+        )
+        recipe = self.recipes[0]
+        response = client.get(f'/api/recipes/{recipe.pk}/{query}')
+        self.assertEqual(
+            self.render(response.data),
+            self.render(
+                next(item for item in expected if item['id'] == recipe.pk)
+            ),
+        )
+
+    def test_anonymous_bodies(self):
+        self.assert_bodies_match()
+
+    def test_anonymous_responses(self):
+        self.assert_responses_match(None)
+
+    def test_authenticated_responses(self):
+        self.assert_responses_match(self.users[2])
+
+    def test_toggle_keeps_responses_identical(self):
+        recipe = self.recipes[0]
+        urls = [
+            '/api/recipes/?limit=6',
+            f'/api/recipes/?author={recipe.author_id}',
+            f'/api/recipes/?tags={self.tags[0].slug}',
+            '/api/recipes/?is_favorited=1',
+            '/api/recipes/?ordering=-favorites_count',
+            f'/api/recipes/{recipe.pk}/',
+        ]
+        client = self.client_for(self.users[2])
+        for url in urls:
+            cache.clear()
+            catalog.get_catalog()
+            lean_response = client.get(url)
+            with self.settings(LEAN_READ_VIEWS=[]):
+                cache.clear()
+                catalog.get_catalog()
+                response = client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(lean_response.content, response.content, url)
+
+    def test_rendition_variant(self):
+        Recipe.objects.update(image_hash='0' * 64)
+        self.assert_bodies_match(self.variant)
+        self.assert_responses_match(None, self.variant)
+        self.assert_responses_match(self.users[2], self.variant)
+
+
+class ExplainQueriesTest(RecipeDataTestCase):
+    def test_seq_scans(self):
+        scan = ['SCAN t']
+        for sql in (
+            'SELECT a FROM t ORDER BY a LIMIT 5',
+            'SELECT a FROM t WHERE a = 1 ORDER BY "t"."id" ASC LIMIT 5',
+            'SELECT a FROM t ORDER BY "t"."id" ASC LIMIT 5 OFFSET 5',
+        ):
+            self.assertEqual(seq_scans(sql, scan, 'sqlite'), scan)
+        self.assertEqual(
+            seq_scans(
+                'SELECT a, EXISTS(SELECT 1 FROM s WHERE s.t = t.id) '
+                'FROM t ORDER BY "t"."id" ASC LIMIT 5',
+                scan,
+                'sqlite',
+            ),
+            [],
+        )
+        for line in (
+            'SCAN t USING INDEX t_a_idx',
+            'SCAN t USING COVERING INDEX t_a_idx',
+        ):
+            self.assertEqual(
+                seq_scans(
+                    'SELECT a FROM t WHERE b = 1 ORDER BY a LIMIT 5',
+                    [line],
+                    'sqlite',
+                ),
+                [],
+            )
+        self.assertEqual(
+            seq_scans(
+                'SELECT a FROM t JOIN s ON s.t = t.id '
+                'ORDER BY "t"."id" ASC LIMIT 5',
+                [*scan, 'SCAN s'],
+                'sqlite',
+            ),
+            ['SCAN s'],
+        )
+
+    def test_command_checks_streamed_queries(self):
+        self.client_for(self.users[2]).post(
+            f'/api/recipes/{self.recipes[2].pk}/shopping_cart/'
+        )
+        output = io.StringIO()
+        call_command('explain_queries', user=self.users[2].pk, stdout=output)
+        self.assertNotIn(
+            'download_shopping_cart/: 0 запросов', output.getvalue()
+        )
+
+
+class QueryBudgetTest(RecipeDataTestCase):
+    def get_urls(self):
+        recipe = self.recipes[0]
+        return {
+            'RecipeViewSet.list': '/api/recipes/',
+            'RecipeViewSet.retrieve': f'/api/recipes/{recipe.pk}/',
+            'RecipeViewSet.feed': '/api/recipes/feed/',
+            'RecipeViewSet.cook': '/api/recipes/cook/?ingredients='
+            + ','.join(str(ingredient.pk) for ingredient in self.ingredients),
+            'RecipeViewSet.download_shopping_cart': (
+                '/api/recipes/download_shopping_cart/'
+            ),
+            'CustomUserViewSet.list': '/api/users/',
+            'CustomUserViewSet.retrieve': f'/api/users/{recipe.author_id}/',
+            'CustomUserViewSet.subscriptions': '/api/users/subscriptions/',
+            'CustomCurrentUser.get': '/api/users/me/',
+        }
+
+    def token_client(self, user):
+        client = APIClient()
+        client.credentials(
+            HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=user)}'
+        )
+        return client
+
+    @override_settings(QUERY_BUDGET_MODE='raise')
+    def test_views_fit_budgets(self):
+        urls = self.get_urls()
+        self.assertEqual(set(urls), set(settings.QUERY_BUDGETS))
+        client = self.token_client(self.users[2])
+        for view_name, url in urls.items():
+            with self.subTest(view_name):
+                response = client.get(url)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(
+                    get_view_name(response.wsgi_request), view_name
+                )
+
+    @override_settings(
+        QUERY_BUDGET_MODE='raise', QUERY_BUDGETS={'RecipeViewSet.list': 1}
+    )
+    def test_exceeded_budget_raises(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            self.token_client(self.users[2]).get('/api/recipes/')
+
+    def test_fingerprint(self):
+        self.assertEqual(
+            fingerprint(
+                'SELECT "a" FROM "t" WHERE "id" IN (%s) '
+                "AND b = 'x''y' LIMIT 21"
+            ),
+            'SELECT "a" FROM "t" WHERE "id" IN (...) AND b = ? LIMIT ?',
+        )
+        self.assertEqual(
+            fingerprint('SELECT "a" FROM "t" WHERE "id" IN (%s, %s, 3)'),
+            fingerprint('SELECT "a" FROM "t" WHERE "id" IN (%s)'),
+        )
+        self.assertEqual(
+            fingerprint('SELECT (1) AS "a" FROM "t2"'),
+            'SELECT (?) AS "a" FROM "t2"',
+        )
+
+    @override_settings(QUERY_SERVER_TIMING=True)
+    def test_server_timing_header(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client_for().get('/api/recipes/')
+        match = re.fullmatch(
+            r'db;dur=\d+\.\d;desc="(\d+) queries", total;dur=\d+\.\d',
+            response['Server-Timing'],
+        )
+        self.assertIsNotNone(match)
+        self.assertEqual(int(match[1]), len(context.captured_queries))
+
+
+class OrjsonParityTest(RecipeDataTestCase):
+    payloads = [
+        None,
+        [],
+        {'name': 'Щи', 'quote': '"\\', 'separators': '\u2028\u2029'},
+        {'numbers': [0, -1, 2 ** 53, 0.1, 12.5, True, False]},
+        {'date': datetime.datetime(2026, 1, 2, 3, 4, 5, 678901)},
+        {
+            'aware': datetime.datetime(
+                2026, 1, 2, tzinfo=datetime.timezone.utc
+            ),
+            'day': datetime.date(2026, 1, 2),
+            'time': datetime.time(3, 4, 5),
+        },
+        {'amount': decimal.Decimal('1.50'), 'id': uuid.UUID(int=1)},
+        {1: 'ключ-число', 'nested': {'list': [{'a': None}]}},
+    ]
+
+    def test_renderer_output(self):
+        for data in self.payloads:
+            self.assertEqual(
+                OrjsonRenderer().render(data), JSONRenderer().render(data)
+            )
+
+    def test_exponent_floats_keep_values(self):
+        data = [1e-07, 1.5e+300]
+        self.assertEqual(
+            json.loads(OrjsonRenderer().render(data)),
+            json.loads(JSONRenderer().render(data)),
+        )
+
+    def test_renderer_on_responses(self):
+        client = self.client_for(self.users[2])
+        for url in (
+            '/api/recipes/?limit=6',
+            f'/api/recipes/{self.recipes[0].pk}/',
+            '/api/users/subscriptions/',
+            '/api/tags/',
+        ):
+            data = client.get(url).data
+            self.assertEqual(
+                OrjsonRenderer().render(data), JSONRenderer().render(data)
+            )
+
+    def test_parser(self):
+        for body in (
+            b'{"name": "\xd0\xa9\xd0\xb8", "amount": 1.5, "ids": [1, 2]}',
+            b'[null, true, false, "\\u2028", 1e300]',
+        ):
+            self.assertEqual(
+                OrjsonParser().parse(io.BytesIO(body)),
+                JSONParser().parse(io.BytesIO(body)),
+            )
+        for body in (b'{"a": NaN}', b'{"a": 1,}', b'\xff', b''):
+            for parser in (OrjsonParser(), JSONParser()):
+                with self.assertRaises(ParseError):
+                    parser.parse(io.BytesIO(body))
@@ -1,9 +1,20 @@
-from django.db.models import Sum
-from django.http import HttpResponse
+import hashlib
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.db import transaction
+from django.db.models import BooleanField, F, Value
+from django.db.models.functions import Greatest
+from django.http import StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
+from recipes import cookbook, feed
+from recipes.catalog import get_catalog
 from recipes.models import (
-    Favorite, Ingredient, Recipe, ShoppingСart, Subscription, Tag, User,
+    Favorite, Ingredient, IngredientRecipe, Recipe, ShoppingListItem,
+    ShoppingСart, Subscription, Tag, User,
 )
 from rest_framework import (
     exceptions, filters, generics, permissions, status, viewsets,
@@ -11,30 +22,88 @@ from rest_framework import (
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
-from .filters import RecipeFilter
-from .paginators import CustomPaginator
+from . import caching, lean
+from .exceptions import PayloadTooLarge
+from .filters import RecipeFilter, RecipeOrderingFilter
+from .paginators import CustomPaginator, FeedPaginator
 from .permissions import AuthorOrReadOnly
+from .renderers import SHOPPING_CART_RENDERERS
 from .serializers import (
     CustomUserSerializer, IngredientReadSerializer, RecipeInListSerializer,
     RecipeReadSerializer, RecipeWriteSerializer, SubscribeSerializer,
-    TagSerializer,
+    TagSerializer, get_image_variant,
 )
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class CatalogViewMixin:
+    def catalog_response(self, catalog, data):
+        response = get_conditional_response(self.request, etag=catalog.etag)
+        if response is None:
+            response = Response(data)
+        response['ETag'] = catalog.etag
+        return response
+
+    def get_catalog_item(self, items):
+        pk = self.kwargs[self.lookup_field]
+        if not pk.isdigit() or int(pk) not in items:
+            raise exceptions.NotFound()
+        return items[int(pk)]
+
+
+class TagViewSet(CatalogViewMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = (permissions.AllowAny,)
     pagination_class = None
 
+    def list(self, request, *args, **kwargs):
+        catalog = get_catalog()
+        return self.catalog_response(catalog, catalog.tag_list)
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+    def retrieve(self, request, *args, **kwargs):
+        catalog = get_catalog()
+        return self.catalog_response(
+            catalog, self.get_catalog_item(catalog.tags)
+        )
+
+
+class IngredientViewSet(CatalogViewMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientReadSerializer
     permission_classes = (permissions.AllowAny,)
     pagination_class = None
-    filter_backends = (filters.SearchFilter,)
-    search_fields = ('^name',)
+    autocomplete_limit = 10
+    autocomplete_max_limit = 50
+
+    def list(self, request, *args, **kwargs):
+        catalog = get_catalog()
+        name = request.query_params.get('name')
+        if name:
+            ingredients = catalog.ingredients_startswith(name)
+        else:
+            ingredients = catalog.ingredient_list
+        return self.catalog_response(catalog, ingredients)
+
+    def retrieve(self, request, *args, **kwargs):
+        catalog = get_catalog()
+        return self.catalog_response(
+            catalog, self.get_catalog_item(catalog.ingredients)
+        )
+
+    @action(detail=False, methods=['get'])
+    def autocomplete(self, request):
+        name = request.query_params.get('name', '').strip()
+        if not name:
+            return Response([])
+        limit = request.query_params.get('limit', '')
+        if limit.isdigit():
+            limit = min(int(limit), self.autocomplete_max_limit)
+        else:
+            limit = self.autocomplete_limit
+        fuzzy = request.query_params.get('mode') == 'fuzzy'
+        return Response(
+            Ingredient.objects.autocomplete(name, limit, fuzzy=fuzzy)
+        )
 
 
 class CustomUserViewSet(UserViewSet):
@@ -42,6 +111,12 @@ class CustomUserViewSet(UserViewSet):
     serializer_class = CustomUserSerializer
     permission_classes = (permissions.AllowAny,)
     pagination_class = CustomPaginator
+    filter_backends = (filters.OrderingFilter,)
+    ordering_fields = ('recipes_count', 'followers_count')
+    ordering = ('id',)
+
+    def get_queryset(self):
+        return super().get_queryset().with_is_subscribed(self.request.user)
 
     @action(
         detail=True,
@@ -56,13 +131,28 @@ class CustomUserViewSet(UserViewSet):
                 'На самого себя подписаться нельзя.'
             )
         if request.method == 'POST':
+            _, created = Subscription.objects.update_or_create(
+                user=user, author=author
+            )
+            if created:
+                User.objects.filter(pk=author.pk).update(
+                    followers_count=F('followers_count') + 1
+                )
+                feed.invalidate(user.pk)
+            author.is_subscribed = True
             serializer = SubscribeSerializer(
                 author, context={"request": request}
             )
-            Subscription.objects.update_or_create(user=user, author=author)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
-        Subscription.objects.filter(user=user, author=author).delete()
+        deleted, _ = Subscription.objects.filter(
+            user=user, author=author
+        ).delete()
+        if deleted:
+            User.objects.filter(pk=author.pk).update(
+                followers_count=Greatest(F('followers_count') - 1, 0)
+            )
+            feed.invalidate(user.pk)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(
@@ -72,8 +162,11 @@ class CustomUserViewSet(UserViewSet):
     )
     def subscriptions(self, request, pk=None):
         user = self.request.user
-        authors = User.objects.filter(subscriber__user=user)
-        page = self.paginate_queryset(authors)
+        authors = (
+            User.objects.filter(subscriber__user=user)
+            .annotate(is_subscribed=Value(True, output_field=BooleanField()))
+        )
+        page = self.paginate_queryset(self.filter_queryset(authors))
         serializer = SubscribeSerializer(
             page, many=True, context={"request": request}
         )
@@ -94,8 +187,201 @@ class RecipeViewSet(viewsets.ModelViewSet):
     serializer_class = RecipeReadSerializer
     permission_classes = (AuthorOrReadOnly,)
     pagination_class = CustomPaginator
-    filter_backends = (DjangoFilterBackend,)
+    filter_backends = (DjangoFilterBackend, RecipeOrderingFilter)
     filterset_class = RecipeFilter
+    ordering_fields = ('pub_date', 'favorites_count', 'in_carts_count')
+    ordering = ('-pub_date', '-id')
+    cook_limit = 10
+    cook_max_limit = 50
+    anonymous_cache_params = (
+        'page',
+        'limit',
+        'cursor',
+        'ordering',
+        'search',
+        'tags_match',
+        'image_size',
+        'image_format',
+    )
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if self.action in ('create', 'partial_update'):
+            content_length = request.META.get('CONTENT_LENGTH', '')
+            if content_length.isdigit() and int(content_length) > (
+                settings.RECIPE_UPLOAD_MAX_SIZE
+            ):
+                raise PayloadTooLarge()
+
+    def get_queryset(self):
+        user = self.request.user
+        return Recipe.objects.with_user_flags(user).with_related(user)
+
+    def get_etag(self, versions):
+        return quote_etag(
+            hashlib.md5(
+                repr((versions, get_catalog().etag)).encode()
+            ).hexdigest()
+        )
+
+    def finalize_conditional(self, response, etag, last_modified=None):
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        patch_vary_headers(response, ('Authorization',))
+        return response
+
+    def get_anonymous_cache_key(self):
+        request = self.request
+        if request.user.is_authenticated:
+            return None
+        params = request.query_params
+        catalog = get_catalog()
+        slugs = params.getlist('tags')
+        if any(slug not in catalog.tag_ids_by_slug for slug in slugs):
+            return None
+        tag_ids = sorted({catalog.tag_ids_by_slug[slug] for slug in slugs})
+        authors = [author for author in params.getlist('author') if author]
+        if len(authors) > 1 or not all(map(str.isdigit, authors)):
+            return None
+        author = int(authors[0]) if authors else None
+        pk = self.kwargs.get(self.lookup_field)
+        if pk is not None:
+            if not pk.isdigit():
+                return None
+            pk = int(pk)
+
+        scopes = [f'tag:{tag_id}' for tag_id in tag_ids]
+        if author is not None:
+            scopes.append(f'author:{author}')
+        if self.action == 'retrieve':
+            scopes = [f'recipe:{pk}']
+        parts = (
+            self.action,
+            pk,
+            request.scheme,
+            request.get_host(),
+            catalog.etag,
+            tuple(tag_ids),
+            author,
+            *(params.get(name) for name in self.anonymous_cache_params),
+        )
+        return caching.response_key(parts, scopes or ['all'])
+
+    def cached_response(self, data, etag, last_modified):
+        response = get_conditional_response(
+            self.request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = Response(data)
+        return self.finalize_conditional(response, etag, last_modified)
+
+    def get_bodies(self, recipe_ids):
+        if type(self).__name__ in settings.LEAN_READ_VIEWS:
+            return lean.recipe_bodies(recipe_ids, self.request)
+        anonymous = AnonymousUser()
+        recipes = (
+            Recipe.objects.filter(pk__in=recipe_ids)
+            .with_user_flags(anonymous)
+            .with_related(anonymous)
+        )
+        return self.get_serializer(recipes, many=True).data
+
+    def get_recipes_data(self, versions):
+        request = self.request
+        catalog_etag = get_catalog().etag
+        keys = {
+            version['id']: caching.body_key(
+                (
+                    version['id'],
+                    version['revision'],
+                    version['author__username'],
+                    version['author__email'],
+                    version['author__first_name'],
+                    version['author__last_name'],
+                    request.scheme,
+                    request.get_host(),
+                    catalog_etag,
+                    get_image_variant(request),
+                )
+            )
+            for version in versions
+        }
+        bodies = caching.get_bodies(keys.values())
+        missing = [pk for pk, key in keys.items() if key not in bodies]
+        if missing:
+            fresh = {
+                keys[body['id']]: body for body in self.get_bodies(missing)
+            }
+            caching.set_bodies(fresh)
+            bodies.update(fresh)
+
+        data = []
+        for version in versions:
+            body = bodies[keys[version['id']]]
+            data.append(
+                dict(
+                    body,
+                    author=dict(
+                        body['author'],
+                        is_subscribed=version['author_is_subscribed'],
+                    ),
+                    is_favorited=version['is_favorited'],
+                    is_in_shopping_cart=version['is_in_shopping_cart'],
+                )
+            )
+        return data
+
+    def list(self, request, *args, **kwargs):
+        cache_key = self.get_anonymous_cache_key()
+        if cache_key is not None:
+            cached = caching.get_response(cache_key)
+            if cached is not None:
+                return self.cached_response(*cached)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset.versions(request.user))
+        if page is not None:
+            versions = self.get_paginated_response(page).data
+        else:
+            page = versions = list(queryset.versions(request.user))
+        etag = self.get_etag(versions)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            data = self.get_recipes_data(page)
+            if self.paginator is not None:
+                response = self.get_paginated_response(data)
+            else:
+                response = Response(data)
+            if cache_key is not None:
+                caching.set_response(cache_key, response.data, etag)
+        return self.finalize_conditional(response, etag)
+
+    def retrieve(self, request, *args, **kwargs):
+        cache_key = self.get_anonymous_cache_key()
+        if cache_key is not None:
+            cached = caching.get_response(cache_key)
+            if cached is not None:
+                return self.cached_response(*cached)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        version = generics.get_object_or_404(
+            queryset.versions(request.user), pk=kwargs[self.lookup_field]
+        )
+        etag = self.get_etag(version)
+        last_modified = None
+        if not request.user.is_authenticated:
+            last_modified = int(version['updated_at'].timestamp())
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = Response(self.get_recipes_data([version])[0])
+            if cache_key is not None:
+                caching.set_response(
+                    cache_key, response.data, etag, last_modified
+                )
+        return self.finalize_conditional(response, etag, last_modified)
 
     def get_serializer_class(self):
         if self.request.method in ['PATCH', 'POST']:
@@ -104,22 +390,136 @@ class RecipeViewSet(viewsets.ModelViewSet):
             raise exceptions.ValidationError('Метод PUT не разрешен.')
         return self.serializer_class
 
+    @action(
+        detail=False,
+        methods=['get'],
+        permission_classes=(permissions.IsAuthenticated,),
+    )
+    def feed(self, request):
+        paginator = FeedPaginator()
+        entries = paginator.paginate_feed(
+            lambda before, limit: feed.get_feed(request.user, before, limit),
+            request,
+        )
+        versions = {
+            version['id']: version
+            for version in self.get_queryset()
+            .filter(pk__in=[recipe_id for _, recipe_id in entries])
+            .versions(request.user)
+        }
+        return paginator.get_paginated_response(
+            self.get_recipes_data(
+                [
+                    versions[recipe_id]
+                    for _, recipe_id in entries
+                    if recipe_id in versions
+                ]
+            )
+        )
+
+    @action(detail=False, methods=['get'])
+    def cook(self, request):
+        ingredient_ids = [
+            int(ingredient_id)
+            for value in request.query_params.getlist('ingredients')
+            for ingredient_id in value.split(',')
+            if ingredient_id.strip().isdigit()
+        ]
+        limit = request.query_params.get('limit', '')
+        if limit.isdigit():
+            limit = min(int(limit), self.cook_max_limit)
+        else:
+            limit = self.cook_limit
+        ranked = cookbook.get_index().top(ingredient_ids, limit)
+        versions = {
+            version['id']: version
+            for version in self.get_queryset()
+            .filter(pk__in=[recipe_id for recipe_id, _ in ranked])
+            .versions(request.user)
+        }
+        ranked = [
+            (recipe_id, coverage)
+            for recipe_id, coverage in ranked
+            if recipe_id in versions
+        ]
+        data = self.get_recipes_data(
+            [versions[recipe_id] for recipe_id, _ in ranked]
+        )
+        for item, (_, coverage) in zip(data, ranked):
+            item['coverage'] = round(coverage, 4)
+        return Response(data)
+
+    @transaction.atomic
     def perform_create(self, serializer):
-        serializer.save(author=self.request.user)
+        recipe = serializer.save(author=self.request.user)
+        User.objects.filter(pk=self.request.user.pk).update(
+            recipes_count=F('recipes_count') + 1
+        )
+        caching.invalidate_recipe(
+            recipe.pk,
+            recipe.author_id,
+            [tag.id for tag in serializer.validated_data['tags']],
+        )
 
         return self.perform_create
 
-    def recipe_in_list(self, request, recipe_model):
+    def perform_update(self, serializer):
+        old_tags = [tag.id for tag in serializer.instance.tags.all()]
+        recipe = serializer.save()
+        caching.invalidate_recipe(
+            recipe.pk,
+            recipe.author_id,
+            old_tags
+            + [tag.id for tag in serializer.validated_data.get('tags', [])],
+        )
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        users = list(
+            ShoppingСart.objects.filter(recipe=instance).values_list(
+                'user', flat=True
+            )
+        )
+        ingredients = list(
+            instance.ingredients.values_list('id', flat=True)
+        )
+        caching.invalidate_recipe(
+            instance.pk,
+            instance.author_id,
+            [tag.id for tag in instance.tags.all()],
+        )
+        instance.delete()
+        ShoppingListItem.objects.refresh(users, ingredients)
+        User.objects.filter(pk=instance.author_id).update(
+            recipes_count=Greatest(F('recipes_count') - 1, 0)
+        )
+
+    def recipe_in_list(self, request, recipe_model, counter, on_change=None):
         user = self.request.user
         recipe = self.get_object()
+        recipes = Recipe.objects.filter(pk=recipe.pk)
         if request.method == 'POST':
             serializer = RecipeInListSerializer(
                 recipe, context={"request": request}
             )
-            recipe_model.objects.update_or_create(user=user, recipe=recipe)
+            _, created = recipe_model.objects.update_or_create(
+                user=user, recipe=recipe
+            )
+            if created:
+                recipes.touch(**{counter: F(counter) + 1})
+                caching.invalidate_recipe_detail(recipe.pk)
+                if on_change is not None:
+                    on_change(recipe)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
-        recipe_model.objects.filter(user=user, recipe=recipe).delete()
+        deleted, _ = recipe_model.objects.filter(
+            user=user, recipe=recipe
+        ).delete()
+        if deleted:
+            recipes.touch(**{counter: Greatest(F(counter) - 1, 0)})
+            caching.invalidate_recipe_detail(recipe.pk)
+            if on_change is not None:
+                on_change(recipe)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(
@@ -127,36 +527,53 @@ class RecipeViewSet(viewsets.ModelViewSet):
         methods=['post', 'delete'],
         permission_classes=(permissions.IsAuthenticated,),
     )
+    @transaction.atomic
     def favorite(self, request, pk=None):
-        return self.recipe_in_list(request, Favorite)
+        return self.recipe_in_list(request, Favorite, 'favorites_count')
 
     @action(
         detail=True,
         methods=['post', 'delete'],
         permission_classes=(permissions.IsAuthenticated,),
     )
+    @transaction.atomic
     def shopping_cart(self, request, pk=None):
-        return self.recipe_in_list(request, ShoppingСart)
+        return self.recipe_in_list(
+            request,
+            ShoppingСart,
+            'in_carts_count',
+            on_change=self.refresh_shopping_list,
+        )
+
+    def refresh_shopping_list(self, recipe):
+        ShoppingListItem.objects.refresh(
+            [self.request.user.id],
+            IngredientRecipe.objects.filter(recipe=recipe).values(
+                'ingredient'
+            ),
+        )
 
     @action(
         detail=False,
         methods=['get'],
         permission_classes=(permissions.IsAuthenticated,),
+        renderer_classes=SHOPPING_CART_RENDERERS,
     )
     def download_shopping_cart(self, request, pk=None):
-        user = request.user
-        recipes = Recipe.objects.filter(recipe__user=user)
-        name = 'ingredients__name'
-        unit = 'ingredients__measurement_unit__name'
-        amount = 'ingredientrecipe_recipes__amount'
-        total = 'total'
         ingredients = (
-            recipes.values(name, unit)
-            .order_by(name)
-            .annotate(total=Sum(amount))
+            ShoppingListItem.objects.filter(user=request.user)
+            .values('ingredient__name', 'ingredient__measurement_unit__name')
+            .annotate(total=F('amount'))
+            .order_by('ingredient__name')
         )
-        data = [
-            f'{item.get(name)} - {item.get(total)} {item.get(unit)}'
-            for item in ingredients
-        ]
-        return HttpResponse('\n'.join(data), content_type='text/plain')
+        renderer = request.accepted_renderer
+        content_type = renderer.media_type
+        if renderer.charset:
+            content_type = f'{content_type}; charset={renderer.charset}'
+        response = StreamingHttpResponse(
+            renderer.stream(ingredients.iterator()), content_type=content_type
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="shopping_cart.{renderer.format}"'
+        )
+        return response
@@ -40,6 +40,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'api.apps.ApiConfig',
     'users.apps.UsersConfig',
     'recipes.apps.RecipesConfig',
@@ -52,6 +53,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'api.middleware.QueryBudgetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -145,6 +147,15 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.TokenAuthentication',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.OrjsonRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'api.parsers.OrjsonParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 5,
     'SEARCH_PARAM': 'name',
@@ -168,4 +179,71 @@ DJOSER = {
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache',
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', default=''),
+    }
+}
+
+CATALOG_CACHE_TIMEOUT = int(os.getenv('CATALOG_CACHE_TIMEOUT', default=60))
+
+RECIPES_CACHE_TIMEOUT = int(os.getenv('RECIPES_CACHE_TIMEOUT', default=300))
+
+LEAN_READ_VIEWS = os.getenv('LEAN_READ_VIEWS', default='RecipeViewSet').split(
+    ','
+)
+
+FEED_CACHE_TIMEOUT = int(os.getenv('FEED_CACHE_TIMEOUT', default=60))
+
+FEED_CACHE_SIZE = int(os.getenv('FEED_CACHE_SIZE', default=200))
+
+COOKBOOK_JOURNAL_TIMEOUT = int(
+    os.getenv('COOKBOOK_JOURNAL_TIMEOUT', default=24 * 60 * 60)
+)
+
+COOKBOOK_SYNC_INTERVAL = int(os.getenv('COOKBOOK_SYNC_INTERVAL', default=60))
+
+RECIPE_UPLOAD_MAX_SIZE = int(
+    os.getenv('RECIPE_UPLOAD_MAX_SIZE', default=10 * 1024 * 1024)
+)
+
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', default=2))
+
+IMAGE_RENDITION_WORKERS = int(
+    os.getenv('IMAGE_RENDITION_WORKERS', default=2)
+)
+
+IMAGE_MAX_SIZE = int(os.getenv('IMAGE_MAX_SIZE', default=2048))
+
+IMAGE_QUALITY = int(os.getenv('IMAGE_QUALITY', default=80))
+
+QUERY_BUDGET_MODE = os.getenv('QUERY_BUDGET_MODE', default='off')
+
+QUERY_SERVER_TIMING = (
+    os.getenv('QUERY_SERVER_TIMING', default='false').lower() == 'true'
+)
+
+N_PLUS_ONE_THRESHOLD = int(os.getenv('N_PLUS_ONE_THRESHOLD', default=5))
+
+QUERY_BUDGETS = {
+    'RecipeViewSet.list': 6,
+    'RecipeViewSet.retrieve': 5,
+    'RecipeViewSet.feed': 7,
+    'RecipeViewSet.cook': 6,
+    'RecipeViewSet.download_shopping_cart': 3,
+    'CustomUserViewSet.list': 3,
+    'CustomUserViewSet.retrieve': 2,
+    'CustomUserViewSet.subscriptions': 4,
+    'CustomCurrentUser.get': 3,
+}
+
+SHOPPING_CART_PDF_FONT = os.getenv(
+    'SHOPPING_CART_PDF_FONT',
+    default='/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
+)
+
 DEFAULT_AUTO_FIELD = 'django.db.models.AutoField'
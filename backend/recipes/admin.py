@@ -1,9 +1,12 @@
+from api.caching import invalidate_recipes
 from django.contrib.admin import ModelAdmin, display, register, site
 from django_admin_listfilter_dropdown.filters import (
     DropdownFilter, RelatedDropdownFilter,
 )
 
+from . import images
 from .models import Ingredient, IngredientRecipe, Recipe, Tag, TagRecipe, Unit
+from .signals import touch_recipes
 
 site.register(Unit)
 site.register(Tag)
@@ -20,8 +23,33 @@ class IngredientAdmin(ModelAdmin):
     empty_value_display = "-пусто-"
 
 
+class RecipeRowAdmin(ModelAdmin):
+    def save_model(self, request, obj, form, change):
+        recipe_ids = {obj.recipe_id}
+        if change:
+            recipe_ids.update(
+                self.model.objects.filter(pk=obj.pk).values_list(
+                    "recipe", flat=True
+                )
+            )
+        super().save_model(request, obj, form, change)
+        touch_recipes(recipe_ids)
+        invalidate_recipes(recipe_ids)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        touch_recipes([obj.recipe_id])
+        invalidate_recipes([obj.recipe_id])
+
+    def delete_queryset(self, request, queryset):
+        recipe_ids = set(queryset.values_list("recipe", flat=True))
+        super().delete_queryset(request, queryset)
+        touch_recipes(recipe_ids)
+        invalidate_recipes(recipe_ids)
+
+
 @register(IngredientRecipe)
-class IngredientRecipeAdmin(ModelAdmin):
+class IngredientRecipeAdmin(RecipeRowAdmin):
     list_per_page = 10
     list_display = ("id", "recipe")
     list_display_links = ("id", "recipe")
@@ -31,7 +59,7 @@ class IngredientRecipeAdmin(ModelAdmin):
 
 
 @register(TagRecipe)
-class TagRecipeAdmin(ModelAdmin):
+class TagRecipeAdmin(RecipeRowAdmin):
     list_per_page = 10
     list_display = ("id", "recipe")
     list_display_links = ("id", "recipe")
@@ -59,6 +87,25 @@ class RecipeAdmin(ModelAdmin):
     readonly_fields = ("get_ingredients", "get_tags", "get_favorites")
     empty_value_display = "-пусто-"
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        image_changed = not change or "image" in form.changed_data
+        recipes = Recipe.objects.filter(pk=obj.pk)
+        recipes.touch(**({"image_hash": ""} if image_changed else {}))
+        if not change:
+            recipes.update_search_vector()
+        if image_changed:
+            images.schedule_renditions(obj)
+        invalidate_recipes([obj.pk])
+
+    def delete_model(self, request, obj):
+        invalidate_recipes([obj.pk])
+        super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        invalidate_recipes(queryset.values_list("pk", flat=True))
+        super().delete_queryset(request, queryset)
+
     @display(description="Теги")
     def get_tags(self, obj):
         if obj.tags_list:
@@ -67,9 +114,7 @@ class RecipeAdmin(ModelAdmin):
 
     @display(description="В избранном")
     def get_favorites(self, obj):
-        if obj.favorite.count():
-            return obj.favorite.count()
-        return "0"
+        return obj.favorites_count
 
     @display(description="Ингредиенты")
     def get_ingredients(self, obj):
@@ -0,0 +1,87 @@
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.http import quote_etag
+
+from .models import Ingredient, Tag, Unit
+
+VERSION_KEY = 'catalog:version'
+SNAPSHOT_KEY = 'catalog:snapshot:{}'
+
+_snapshot = None
+
+
+class Catalog:
+    def __init__(self, version, tags, units, ingredients):
+        self.version = version
+        self.etag = quote_etag(
+            hashlib.md5(repr((tags, units, ingredients)).encode()).hexdigest()
+        )
+        self.tags = {tag['id']: tag for tag in tags}
+        self.tag_ids_by_slug = {tag['slug']: tag['id'] for tag in tags}
+        self.tag_list = tags
+        self.units = units
+        self.ingredient_list = [
+            {
+                'id': id,
+                'name': name,
+                'measurement_unit': units[unit_id],
+            }
+            for id, name, unit_id in ingredients
+        ]
+        self.ingredients = {
+            ingredient['id']: ingredient
+            for ingredient in self.ingredient_list
+        }
+
+    def ingredients_startswith(self, name):
+        name = name.lower()
+        return [
+            ingredient
+            for ingredient in self.ingredient_list
+            if ingredient['name'].lower().startswith(name)
+        ]
+
+
+def load():
+    return (
+        list(Tag.objects.order_by('id').values('id', 'name', 'color', 'slug')),
+        dict(Unit.objects.values_list('id', 'name')),
+        list(
+            Ingredient.objects.order_by('id').values_list(
+                'id', 'name', 'measurement_unit'
+            )
+        ),
+    )
+
+
+def get_catalog():
+    global _snapshot
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        version = uuid.uuid4().hex
+        if not cache.add(VERSION_KEY, version, timeout=None):
+            version = cache.get(VERSION_KEY, version)
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.version == version:
+        return snapshot
+
+    data = cache.get(SNAPSHOT_KEY.format(version))
+    if data is None:
+        data = load()
+        cache.set(
+            SNAPSHOT_KEY.format(version),
+            data,
+            timeout=settings.CATALOG_CACHE_TIMEOUT,
+        )
+    snapshot = Catalog(version, *data)
+    _snapshot = snapshot
+    return snapshot
+
+
+def invalidate():
+    global _snapshot
+    _snapshot = None
+    cache.set(VERSION_KEY, uuid.uuid4().hex, timeout=None)
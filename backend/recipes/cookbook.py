@@ -0,0 +1,176 @@
+import heapq
+import threading
+
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import IngredientRecipe, Recipe
+
+JOURNAL_KEY = 'cookbook:journal'
+ENTRY_KEY = 'cookbook:journal:{}'
+JOURNAL_LIMIT = 1000
+
+_index = None
+_lock = threading.Lock()
+
+
+def load(recipe_ids=None):
+    rows = IngredientRecipe.objects.order_by()
+    if recipe_ids is not None:
+        rows = rows.filter(recipe__in=recipe_ids)
+    recipes = defaultdict(list)
+    for recipe_id, ingredient_id in rows.values_list(
+        'recipe_id', 'ingredient_id'
+    ).iterator():
+        recipes[recipe_id].append(ingredient_id)
+    return recipes
+
+
+class Index:
+    def __init__(self, position, synced_at, recipes, postings):
+        self.position = position
+        self.synced_at = synced_at
+        self.recipes = recipes
+        self.postings = postings
+
+    @classmethod
+    def build(cls, position):
+        synced_at = timezone.now()
+        recipes = {
+            recipe_id: tuple(ingredient_ids)
+            for recipe_id, ingredient_ids in load().items()
+        }
+        postings = defaultdict(list)
+        for recipe_id, ingredient_ids in recipes.items():
+            for ingredient_id in ingredient_ids:
+                postings[ingredient_id].append(recipe_id)
+        return cls(
+            position,
+            synced_at,
+            recipes,
+            {
+                ingredient_id: array('l', sorted(recipe_ids))
+                for ingredient_id, recipe_ids in postings.items()
+            },
+        )
+
+    def refreshed(self, position, synced_at, recipe_ids):
+        if not recipe_ids:
+            return Index(position, synced_at, self.recipes, self.postings)
+        loaded = load(recipe_ids)
+        recipes = dict(self.recipes)
+        copies = {}
+
+        def posting(ingredient_id):
+            if ingredient_id not in copies:
+                copies[ingredient_id] = array(
+                    'l', self.postings.get(ingredient_id, ())
+                )
+            return copies[ingredient_id]
+
+        for recipe_id in recipe_ids:
+            for ingredient_id in recipes.pop(recipe_id, ()):
+                recipe_ids_with = posting(ingredient_id)
+                position_in = bisect_left(recipe_ids_with, recipe_id)
+                if (
+                    position_in < len(recipe_ids_with)
+                    and recipe_ids_with[position_in] == recipe_id
+                ):
+                    del recipe_ids_with[position_in]
+            if loaded[recipe_id]:
+                recipes[recipe_id] = tuple(loaded[recipe_id])
+                for ingredient_id in recipes[recipe_id]:
+                    insort(posting(ingredient_id), recipe_id)
+        return Index(
+            position, synced_at, recipes, {**self.postings, **copies}
+        )
+
+    def top(self, ingredient_ids, limit):
+        covered = Counter()
+        for ingredient_id in set(ingredient_ids):
+            covered.update(self.postings.get(ingredient_id, ()))
+        recipes = self.recipes
+        ranked = heapq.nlargest(
+            limit,
+            covered.items(),
+            key=lambda item: (
+                item[1] / len(recipes[item[0]]),
+                item[1],
+                item[0],
+            ),
+        )
+        return [
+            (recipe_id, count / len(recipes[recipe_id]))
+            for recipe_id, count in ranked
+        ]
+
+
+def get_index():
+    index = _index
+    if index is None:
+        with _lock:
+            if _index is None:
+                sync(None)
+    elif _lock.acquire(blocking=False):
+        try:
+            sync(index)
+        finally:
+            _lock.release()
+    return _index
+
+
+def sync(index):
+    global _index
+    position = cache.get(JOURNAL_KEY, 0)
+    if (
+        index is None
+        or position < index.position
+        or position - index.position > JOURNAL_LIMIT
+    ):
+        _index = Index.build(position)
+        return
+    recipe_ids = set()
+    if position > index.position:
+        entries = cache.get_many(
+            [
+                ENTRY_KEY.format(entry)
+                for entry in range(index.position + 1, position + 1)
+            ]
+        )
+        if len(entries) < position - index.position:
+            _index = Index.build(position)
+            return
+        recipe_ids.update(entries.values())
+    synced_at = index.synced_at
+    interval = timedelta(seconds=settings.COOKBOOK_SYNC_INTERVAL)
+    now = timezone.now()
+    if now - synced_at >= interval:
+        recipe_ids.update(
+            Recipe.objects.filter(
+                updated_at__gte=synced_at - interval
+            ).values_list('pk', flat=True)
+        )
+        synced_at = now
+    if recipe_ids or synced_at != index.synced_at:
+        _index = index.refreshed(position, synced_at, recipe_ids)
+
+
+def record(recipe_id):
+    cache.add(JOURNAL_KEY, 0, timeout=None)
+    position = cache.incr(JOURNAL_KEY)
+    cache.set(
+        ENTRY_KEY.format(position),
+        recipe_id,
+        timeout=settings.COOKBOOK_JOURNAL_TIMEOUT,
+    )
+
+
+def invalidate():
+    cache.add(JOURNAL_KEY, 0, timeout=None)
+    cache.incr(JOURNAL_KEY, JOURNAL_LIMIT + 1)
@@ -0,0 +1,46 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+
+from .models import Recipe
+
+FEED_KEY = 'feed:{}'
+
+
+def merge(user, before, limit):
+    queryset = Recipe.objects.filter(author__subscriber__user=user)
+    if before is not None:
+        pub_date, recipe_id = before
+        queryset = queryset.filter(
+            Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, id__lt=recipe_id)
+        )
+    queryset = queryset.order_by('-pub_date', '-id')
+    return list(queryset.values_list('pub_date', 'id')[:limit])
+
+
+def get_feed(user, before, limit):
+    timeout = settings.FEED_CACHE_TIMEOUT
+    if timeout:
+        key = FEED_KEY.format(user.pk)
+        entries = cache.get(key)
+        if entries is None:
+            entries = merge(user, None, settings.FEED_CACHE_SIZE)
+            cache.set(key, entries, timeout)
+        start = 0
+        if before is not None:
+            start = next(
+                (
+                    position
+                    for position, entry in enumerate(entries)
+                    if entry < before
+                ),
+                len(entries),
+            )
+        page = entries[start:start + limit]
+        if len(page) == limit or len(entries) < settings.FEED_CACHE_SIZE:
+            return page
+    return merge(user, before, limit)
+
+
+def invalidate(user_id):
+    cache.delete(FEED_KEY.format(user_id))
@@ -0,0 +1,152 @@
+import base64
+import hashlib
+import io
+import logging
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+
+from api.caching import invalidate_recipes
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.db import connection, transaction
+from PIL import Image, ImageOps
+
+from .models import Recipe
+
+logger = logging.getLogger(__name__)
+
+RENDITIONS = {'thumbnail': 320, 'medium': 800}
+FORMATS = {'jpeg': ('JPEG', 'jpg'), 'webp': ('WEBP', 'webp')}
+RENDITIONS_DIR = 'recipes/renditions'
+RENDITION_NAME = RENDITIONS_DIR + '/{}/{}.{}'
+BASE64_CHUNK = 64 * 1024
+
+_executors = {}
+_lock = threading.Lock()
+
+
+def get_executor(name, max_workers):
+    with _lock:
+        if name not in _executors:
+            _executors[name] = ThreadPoolExecutor(
+                max_workers=max_workers, thread_name_prefix=f'images-{name}'
+            )
+        return _executors[name]
+
+
+def run(func, *args):
+    executor = get_executor('decode', settings.IMAGE_WORKERS)
+    return executor.submit(func, *args).result()
+
+
+class ImageTooLarge(ValueError):
+    pass
+
+
+def decode_base64(data, max_size):
+    header, separator, payload = data.partition(';base64,')
+    if not separator:
+        payload = header
+    if ' ' in payload or '\n' in payload:
+        payload = ''.join(payload.split())
+    size = len(payload) // 4 * 3
+    if size > max_size:
+        raise ImageTooLarge(size)
+    if size <= settings.FILE_UPLOAD_MAX_MEMORY_SIZE:
+        return ContentFile(base64.b64decode(payload, validate=True), 'image')
+
+    file = TemporaryUploadedFile('image', None, size, None)
+    for start in range(0, len(payload), BASE64_CHUNK):
+        file.write(
+            base64.b64decode(
+                payload[start:start + BASE64_CHUNK], validate=True
+            )
+        )
+    file.size = file.tell()
+    file.seek(0)
+    return file
+
+
+def image_extension(file):
+    file.seek(0)
+    try:
+        image_format = Image.open(file).format
+    except OSError:
+        return None
+    finally:
+        file.seek(0)
+    return 'jpg' if image_format == 'JPEG' else image_format.lower()
+
+
+def cap_size(file):
+    file.seek(0)
+    image = Image.open(file)
+    max_size = settings.IMAGE_MAX_SIZE
+    if max(image.size) <= max_size:
+        file.seek(0)
+        return file
+    image_format = image.format
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((max_size, max_size))
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format)
+    return ContentFile(buffer.getvalue(), name=file.name)
+
+
+def rendition_name(image_hash, size, image_format):
+    return RENDITION_NAME.format(image_hash, size, FORMATS[image_format][1])
+
+
+def image_url(name, image_hash, variant=None):
+    if not name:
+        return None
+    storage = Recipe._meta.get_field('image').storage
+    if variant is not None and image_hash:
+        return storage.url(rendition_name(image_hash, *variant))
+    return storage.url(name)
+
+
+def build_renditions(recipe_id, name):
+    storage = Recipe._meta.get_field('image').storage
+    with storage.open(name) as file:
+        content = file.read()
+    image_hash = hashlib.sha256(content).hexdigest()
+    image = ImageOps.exif_transpose(Image.open(io.BytesIO(content)))
+    for size, pixels in RENDITIONS.items():
+        rendition = image.copy()
+        rendition.thumbnail((pixels, pixels))
+        for image_format, (pillow_format, _) in FORMATS.items():
+            path = rendition_name(image_hash, size, image_format)
+            output = rendition
+            if pillow_format == 'JPEG' and output.mode != 'RGB':
+                output = output.convert('RGB')
+            buffer = io.BytesIO()
+            output.save(
+                buffer, format=pillow_format, quality=settings.IMAGE_QUALITY
+            )
+            storage.put(path, ContentFile(buffer.getvalue()))
+    if Recipe.objects.filter(pk=recipe_id, image=name).touch(
+        image_hash=image_hash
+    ):
+        invalidate_recipes([recipe_id])
+    return image_hash
+
+
+def build_renditions_task(recipe_id, name):
+    try:
+        build_renditions(recipe_id, name)
+    except Exception:
+        logger.exception('Не удалось подготовить изображения рецепта %s', name)
+    finally:
+        connection.close()
+
+
+def schedule_renditions(recipe):
+    executor = get_executor('renditions', settings.IMAGE_RENDITION_WORKERS)
+    transaction.on_commit(
+        lambda: executor.submit(
+            build_renditions_task, recipe.pk, recipe.image.name
+        )
+    )
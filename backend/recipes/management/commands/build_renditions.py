@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from recipes import images
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Готовит уменьшенные копии картинок рецептов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Пересобрать копии и для уже обработанных рецептов.',
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='')
+        if not options['all']:
+            recipes = recipes.filter(image_hash='')
+        built = 0
+        for recipe_id, name in recipes.values_list('id', 'image').iterator():
+            images.build_renditions(recipe_id, name)
+            built += 1
+        self.stdout.write(f'Обработано рецептов: {built}')
@@ -0,0 +1,67 @@
+import os
+
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from recipes.images import RENDITIONS_DIR
+from recipes.models import Recipe
+
+UPLOAD_DIR = 'recipes'
+
+
+def walk(storage, path):
+    directories, files = storage.listdir(path)
+    for name in files:
+        yield f'{path}/{name}'
+    for directory in directories:
+        yield from walk(storage, f'{path}/{directory}')
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет картинки и их копии, на которые не ссылается '
+        'ни один рецепт.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace',
+            type=int,
+            default=60,
+            help='Не трогать файлы моложе указанного числа минут.',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать, что будет удалено.',
+        )
+
+    def handle(self, *args, **options):
+        storage = Recipe._meta.get_field('image').storage
+        if not storage.exists(UPLOAD_DIR):
+            return
+        images = set()
+        hashes = set()
+        for name, image_hash in Recipe.objects.values_list(
+            'image', 'image_hash'
+        ).iterator():
+            images.add(name)
+            hashes.add(image_hash)
+            hashes.add(os.path.splitext(os.path.basename(name))[0])
+        threshold = timezone.now() - timedelta(minutes=options['grace'])
+
+        removed = 0
+        for name in walk(storage, UPLOAD_DIR):
+            if name.startswith(f'{RENDITIONS_DIR}/'):
+                if name.split('/')[2] in hashes:
+                    continue
+            elif name in images:
+                continue
+            if storage.get_modified_time(name) > threshold:
+                continue
+            if not options['dry_run']:
+                storage.delete(name)
+            self.stdout.write(name)
+            removed += 1
+        self.stdout.write(f'Удалено файлов: {removed}')
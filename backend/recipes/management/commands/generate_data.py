@@ -0,0 +1,266 @@
+import io
+import random
+
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from PIL import Image
+from recipes import catalog, cookbook
+from recipes.models import (
+    Favorite, Ingredient, IngredientRecipe, Recipe, ShoppingСart, Subscription,
+    Tag, TagRecipe, Unit, User,
+)
+
+UNITS = ('г', 'кг', 'мл', 'л', 'шт.', 'ст. л.', 'ч. л.', 'по вкусу')
+SYLLABLES = (
+    'ка', 'ро', 'мо', 'ли', 'на', 'ту', 'ше', 'пи', 'да', 'ве', 'зо', 'лу',
+    'ба', 'ри', 'сы', 'го', 'ча', 'хе', 'ры', 'жи',
+)
+WORDS = (
+    'запечённый', 'тушёный', 'домашний', 'быстрый', 'пряный', 'нежный',
+    'салат', 'суп', 'пирог', 'соус', 'рагу', 'омлет', 'паста', 'каша',
+    'с', 'и', 'по-деревенски', 'в', 'духовке', 'сливках', 'травами',
+)
+
+
+def batches(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет базу синтетическими пользователями, рецептами, '
+        'избранным, корзинами и подписками для нагрузочных замеров. '
+        'Строки вставляются пачками через bulk_create, счётчики, '
+        'итоговые списки покупок и поисковые векторы пересчитываются '
+        'в конце.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument('--ingredients', type=int, default=2000)
+        parser.add_argument('--tags', type=int, default=8)
+        parser.add_argument(
+            '--per-recipe',
+            type=int,
+            default=8,
+            help='Ингредиентов в рецепте.',
+        )
+        parser.add_argument(
+            '--favorites', type=int, default=20, help='На пользователя.'
+        )
+        parser.add_argument(
+            '--carts', type=int, default=3, help='На пользователя.'
+        )
+        parser.add_argument(
+            '--subscriptions', type=int, default=10, help='На пользователя.'
+        )
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--prefix',
+            default='bench',
+            help=(
+                'Префикс имён пользователей, чтобы прогоны не пересекались. '
+                'Повторный прогон с тем же префиксом переиспользует уже '
+                'созданных пользователей.'
+            ),
+        )
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.random = random.Random(options['seed'])
+        self.prefix = options['prefix']
+        ingredient_ids = self.create_ingredients(options['ingredients'])
+        tag_ids = self.create_tags(options['tags'])
+        user_ids = self.create_users(options['users'])
+        recipe_ids = self.create_recipes(user_ids, options['recipes'])
+        self.insert(
+            IngredientRecipe,
+            self.recipe_ingredients(recipe_ids, ingredient_ids),
+        )
+        self.insert(TagRecipe, self.recipe_tags(recipe_ids, tag_ids))
+        self.insert(
+            Favorite,
+            self.pairs(Favorite, 'recipe', user_ids, recipe_ids, 'favorites'),
+            ignore_conflicts=True,
+        )
+        self.insert(
+            ShoppingСart,
+            self.pairs(ShoppingСart, 'recipe', user_ids, recipe_ids, 'carts'),
+            ignore_conflicts=True,
+        )
+        self.insert(
+            Subscription,
+            self.pairs(
+                Subscription, 'author', user_ids, user_ids, 'subscriptions'
+            ),
+            ignore_conflicts=True,
+        )
+
+        call_command('reconcile_counters', stdout=self.stdout)
+        call_command('rebuild_shopping_list', stdout=self.stdout)
+        if recipe_ids:
+            Recipe.objects.filter(
+                pk__gte=min(recipe_ids)
+            ).update_search_vector()
+        catalog.invalidate()
+        cookbook.invalidate()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Пользователей: {len(user_ids)}, '
+                f'рецептов: {len(recipe_ids)}, '
+                f'ингредиентов: {len(ingredient_ids)}.'
+            )
+        )
+
+    def insert(self, model, objects, ignore_conflicts=False):
+        total = 0
+        for batch in batches(objects, self.options['batch_size']):
+            with transaction.atomic():
+                model.objects.bulk_create(
+                    batch, ignore_conflicts=ignore_conflicts
+                )
+            total += len(batch)
+        self.stdout.write(f'{model._meta.verbose_name_plural}: +{total}')
+
+    def word(self, syllables):
+        return ''.join(self.random.choices(SYLLABLES, k=syllables))
+
+    def create_ingredients(self, count):
+        units = [
+            Unit.objects.get_or_create(name=name)[0].pk for name in UNITS
+        ]
+        missing = count - Ingredient.objects.count()
+        self.insert(
+            Ingredient,
+            (
+                Ingredient(
+                    name=f'{self.word(3)} {number}',
+                    measurement_unit_id=self.random.choice(units),
+                )
+                for number in range(max(missing, 0))
+            ),
+        )
+        return list(
+            Ingredient.objects.order_by('id').values_list('id', flat=True)[
+                :count
+            ]
+        )
+
+    def create_tags(self, count):
+        for number in range(Tag.objects.count(), count):
+            Tag.objects.get_or_create(
+                slug=f'{self.prefix}-{number}',
+                defaults={
+                    'name': f'{self.prefix} {number}',
+                    'color': f'#{self.random.randrange(16 ** 6):06X}',
+                },
+            )
+        return list(Tag.objects.values_list('id', flat=True)[:count])
+
+    def create_users(self, count):
+        usernames = [f'{self.prefix}_{number}' for number in range(count)]
+        existing = set()
+        for batch in batches(usernames, self.options['batch_size']):
+            existing.update(
+                User.objects.filter(username__in=batch).values_list(
+                    'username', flat=True
+                )
+            )
+        password = make_password(None)
+        self.insert(
+            User,
+            (
+                User(
+                    username=username,
+                    email=f'{username}@example.com',
+                    first_name=self.word(2).capitalize(),
+                    last_name=self.word(3).capitalize(),
+                    password=password,
+                )
+                for username in usernames
+                if username not in existing
+            ),
+        )
+        user_ids = []
+        for batch in batches(usernames, self.options['batch_size']):
+            user_ids += User.objects.filter(username__in=batch).values_list(
+                'id', flat=True
+            )
+        return sorted(user_ids)
+
+    def create_image(self):
+        buffer = io.BytesIO()
+        Image.new('RGB', (640, 480), (200, 120, 60)).save(
+            buffer, format='JPEG'
+        )
+        storage = Recipe._meta.get_field('image').storage
+        return storage.save(
+            'recipes/image.jpg', ContentFile(buffer.getvalue())
+        )
+
+    def create_recipes(self, user_ids, count):
+        image = self.create_image()
+        last_id = (
+            Recipe.objects.order_by('-id').values_list('id', flat=True).first()
+        )
+        self.insert(
+            Recipe,
+            (
+                Recipe(
+                    author_id=self.random.choice(user_ids),
+                    name=' '.join(self.random.sample(WORDS, 3)).capitalize()
+                    + f' {self.prefix}{number}',
+                    text=' '.join(self.random.choices(WORDS, k=40)),
+                    cooking_time=self.random.randint(5, 180),
+                    image=image,
+                )
+                for number in range(count)
+            ),
+        )
+        return list(
+            Recipe.objects.filter(pk__gt=last_id or 0).values_list(
+                'id', flat=True
+            )
+        )
+
+    def popular(self, ids, count):
+        count = min(count, len(ids))
+        chosen = set()
+        while len(chosen) < count:
+            chosen.add(ids[int(len(ids) * self.random.random() ** 2)])
+        return chosen
+
+    def recipe_ingredients(self, recipe_ids, ingredient_ids):
+        for recipe_id in recipe_ids:
+            for ingredient_id in self.popular(
+                ingredient_ids, self.options['per_recipe']
+            ):
+                yield IngredientRecipe(
+                    recipe_id=recipe_id,
+                    ingredient_id=ingredient_id,
+                    amount=self.random.randint(1, 500),
+                )
+
+    def recipe_tags(self, recipe_ids, tag_ids):
+        for recipe_id in recipe_ids:
+            for tag_id in self.popular(tag_ids, self.random.randint(1, 3)):
+                yield TagRecipe(recipe_id=recipe_id, tag_id=tag_id)
+
+    def pairs(self, model, field, user_ids, target_ids, option):
+        for user_id in user_ids:
+            for target_id in self.popular(target_ids, self.options[option]):
+                if field == 'author' and target_id == user_id:
+                    continue
+                yield model(user_id=user_id, **{f'{field}_id': target_id})
@@ -0,0 +1,71 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Sum
+from recipes.models import IngredientRecipe, ShoppingListItem
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересобирает итоговые списки покупок из корзин пользователей '
+        'и сверяет их с агрегатом по рецептам.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только сверить таблицу, не пересобирая её.',
+        )
+
+    def handle(self, *args, **options):
+        if not options['check']:
+            with transaction.atomic():
+                ShoppingListItem.objects.all().delete()
+                ShoppingListItem.objects.bulk_create(
+                    (
+                        ShoppingListItem(
+                            user_id=user,
+                            ingredient_id=ingredient,
+                            amount=total,
+                        )
+                        for (user, ingredient), total in self.live_totals()
+                    ),
+                    batch_size=1000,
+                )
+            self.stdout.write('Списки покупок пересобраны.')
+
+        expected = dict(self.live_totals())
+        actual = {
+            (user, ingredient): amount
+            for user, ingredient, amount in (
+                ShoppingListItem.objects.values_list(
+                    'user', 'ingredient', 'amount'
+                ).iterator()
+            )
+        }
+        mismatches = [
+            key
+            for key in expected.keys() | actual.keys()
+            if expected.get(key) != actual.get(key)
+        ]
+        for user, ingredient in mismatches[:20]:
+            self.stderr.write(
+                f'Пользователь {user}, ингредиент {ingredient}: '
+                f'ожидается {expected.get((user, ingredient))}, '
+                f'в таблице {actual.get((user, ingredient))}'
+            )
+        if mismatches:
+            raise CommandError(f'Расхождений: {len(mismatches)}.')
+        self.stdout.write(
+            self.style.SUCCESS(f'Сверено строк: {len(expected)}.')
+        )
+
+    def live_totals(self):
+        totals = (
+            IngredientRecipe.objects.filter(recipe__recipe__isnull=False)
+            .values_list('recipe__recipe__user', 'ingredient')
+            .annotate(total=Sum('amount'))
+            .order_by()
+        )
+        for user, ingredient, total in totals.iterator():
+            yield (user, ingredient), total
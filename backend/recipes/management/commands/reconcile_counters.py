@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from recipes.models import Favorite, Recipe, ShoppingСart, Subscription, User
+
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (Recipe, 'in_carts_count', ShoppingСart, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'followers_count', Subscription, 'author'),
+)
+
+
+def count_related(model, field):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(count=Count('pk'))
+            .values('count')
+        ),
+        0,
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает счётчики избранного, покупок, рецептов '
+        'и подписчиков.'
+    )
+
+    def handle(self, *args, **options):
+        for model, counter, related_model, field in COUNTERS:
+            actual = count_related(related_model, field)
+            drifted = (
+                model.objects.annotate(actual=actual)
+                .exclude(**{counter: F('actual')})
+                .values('pk')
+            )
+            fixed = model.objects.filter(pk__in=Subquery(drifted)).update(
+                **{counter: actual}
+            )
+            self.stdout.write(
+                f'{model._meta.model_name}.{counter}: исправлено {fixed}'
+            )
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.14 on 2026-10-18 19:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0018_counters'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-pub_date', '-id'], name='recipes_rec_pub_dat_d83b61_idx'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+from django.db import migrations
+
+POSTGRES_FORWARD = (
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX IF NOT EXISTS recipes_ingredient_name_prefix_idx '
+    'ON recipes_ingredient (LOWER(name) text_pattern_ops)',
+    'CREATE INDEX IF NOT EXISTS recipes_ingredient_name_trgm_idx '
+    'ON recipes_ingredient USING gin (LOWER(name) gin_trgm_ops)',
+)
+POSTGRES_BACKWARD = (
+    'DROP INDEX IF EXISTS recipes_ingredient_name_trgm_idx',
+    'DROP INDEX IF EXISTS recipes_ingredient_name_prefix_idx',
+)
+DEFAULT_FORWARD = (
+    'CREATE INDEX IF NOT EXISTS recipes_ingredient_name_prefix_idx '
+    'ON recipes_ingredient (LOWER(name))',
+)
+DEFAULT_BACKWARD = (
+    'DROP INDEX IF EXISTS recipes_ingredient_name_prefix_idx',
+)
+
+
+def execute(schema_editor, postgres, default):
+    if schema_editor.connection.vendor == 'postgresql':
+        statements = postgres
+    else:
+        statements = default
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def create_indexes(apps, schema_editor):
+    execute(schema_editor, POSTGRES_FORWARD, DEFAULT_FORWARD)
+
+
+def drop_indexes(apps, schema_editor):
+    execute(schema_editor, POSTGRES_BACKWARD, DEFAULT_BACKWARD)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0019_recipe_pub_date_id_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
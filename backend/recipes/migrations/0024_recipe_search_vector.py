@@ -0,0 +1,52 @@
+# Generated by Django 3.2.14 on 2026-10-18 19:36
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+POSTGRES_FORWARD = (
+    "UPDATE recipes_recipe SET search_vector = "
+    "setweight(to_tsvector('russian', COALESCE(name, '')), 'A') || "
+    "setweight(to_tsvector('russian', COALESCE(("
+    "SELECT string_agg(ingredient.name, ' ') "
+    "FROM recipes_ingredientrecipe AS ingredientrecipe "
+    "JOIN recipes_ingredient AS ingredient "
+    "ON ingredient.id = ingredientrecipe.ingredient_id "
+    "WHERE ingredientrecipe.recipe_id = recipes_recipe.id"
+    "), '')), 'B') || "
+    "setweight(to_tsvector('russian', COALESCE(text, '')), 'C')",
+    'CREATE INDEX IF NOT EXISTS recipes_recipe_search_vector_idx '
+    'ON recipes_recipe USING gin (search_vector)',
+)
+POSTGRES_BACKWARD = (
+    'DROP INDEX IF EXISTS recipes_recipe_search_vector_idx',
+)
+
+
+def execute(schema_editor, statements):
+    if schema_editor.connection.vendor == 'postgresql':
+        for statement in statements:
+            schema_editor.execute(statement)
+
+
+def fill_search_vector(apps, schema_editor):
+    execute(schema_editor, POSTGRES_FORWARD)
+
+
+def drop_search_index(apps, schema_editor):
+    execute(schema_editor, POSTGRES_BACKWARD)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0023_recipe_image_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(fill_search_vector, drop_search_index),
+    ]
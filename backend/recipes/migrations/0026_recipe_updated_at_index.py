@@ -0,0 +1,17 @@
+# Generated by Django 3.2.14 on 2026-10-18 20:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0025_recipe_author_pub_date_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['updated_at'], name='recipes_rec_updated_46db5b_idx'),
+        ),
+    ]
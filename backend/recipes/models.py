@@ -1,7 +1,22 @@
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import (
+    SearchQuery, SearchRank, SearchVector, SearchVectorField,
+    TrigramSimilarity,
+)
 from django.core.validators import MinValueValidator
-from django.db import models
+from django.db import connection, models, transaction
+from django.db.models import (
+    BooleanField, Exists, F, OuterRef, Prefetch, Q, Subquery, Sum, Value,
+    Window,
+)
+from django.db.models.functions import Lower, RowNumber
+from django.utils import timezone
 from users.models import User
 
+from .storage import ContentAddressedStorage
+
+SEARCH_CONFIG = 'russian'
+
 
 class Unit(models.Model):
     name = models.CharField(verbose_name='Название', max_length=50)
@@ -14,6 +29,40 @@ class Unit(models.Model):
         return self.name
 
 
+class IngredientQuerySet(models.QuerySet):
+    def name_startswith(self, name):
+        return self.annotate(name_lower=Lower('name')).filter(
+            name_lower__startswith=name.lower()
+        )
+
+    def autocomplete(self, name, limit, fuzzy=False):
+        name = name.lower()
+        fields = ('id', 'name', 'measurement_unit__name')
+
+        rows = list(
+            self.name_startswith(name)
+            .order_by('name_lower')
+            .values_list(*fields)[:limit]
+        )
+        if len(rows) < limit:
+            queryset = self.annotate(name_lower=Lower('name')).exclude(
+                name_lower__startswith=name
+            )
+            if fuzzy and connection.vendor == 'postgresql':
+                queryset = queryset.filter(
+                    name_lower__trigram_similar=name
+                ).order_by(TrigramSimilarity('name_lower', name).desc())
+            else:
+                queryset = queryset.filter(
+                    name_lower__contains=name
+                ).order_by('name_lower')
+            rows += queryset.values_list(*fields)[:limit - len(rows)]
+        return [
+            {'id': id, 'name': ingredient_name, 'measurement_unit': unit}
+            for id, ingredient_name, unit in rows
+        ]
+
+
 class Ingredient(models.Model):
     name = models.CharField(verbose_name='Название', max_length=200)
     measurement_unit = models.ForeignKey(
@@ -23,6 +72,8 @@ class Ingredient(models.Model):
         related_name='units',
     )
 
+    objects = IngredientQuerySet.as_manager()
+
     class Meta:
         indexes = [models.Index(fields=['name'])]
         verbose_name = 'Ингредиенты'
@@ -110,6 +161,158 @@ class TagRecipe(models.Model):
         return f'{self.tag}'
 
 
+class RecipeQuerySet(models.QuerySet):
+    def with_user_flags(self, user):
+        if not user.is_authenticated:
+            return self.annotate(
+                is_favorited=Value(False, output_field=BooleanField()),
+                is_in_shopping_cart=Value(False, output_field=BooleanField()),
+            )
+        return self.annotate(
+            is_favorited=Exists(
+                Favorite.objects.filter(user=user, recipe=OuterRef('pk'))
+            ),
+            is_in_shopping_cart=Exists(
+                ShoppingСart.objects.filter(user=user, recipe=OuterRef('pk'))
+            ),
+        )
+
+    def with_related(self, user):
+        return self.prefetch_related(
+            Prefetch('author', queryset=User.objects.with_is_subscribed(user)),
+            Prefetch('tags', queryset=Tag.objects.order_by('id')),
+            Prefetch(
+                'ingredientrecipe_recipes',
+                queryset=IngredientRecipe.objects.select_related(
+                    'ingredient__measurement_unit'
+                ).order_by('id'),
+            ),
+        )
+
+    def versions(self, user):
+        if user.is_authenticated:
+            author_is_subscribed = Exists(
+                Subscription.objects.filter(
+                    user=user, author=OuterRef('author')
+                )
+            )
+        else:
+            author_is_subscribed = Value(False, output_field=BooleanField())
+        fields = ()
+        if 'search_rank' in self.query.annotations:
+            fields = ('search_rank',)
+        return (
+            self.with_user_flags(user)
+            .annotate(author_is_subscribed=author_is_subscribed)
+            .prefetch_related(None)
+            .values(
+                *fields,
+                'id',
+                'revision',
+                'updated_at',
+                'pub_date',
+                'favorites_count',
+                'in_carts_count',
+                'author__username',
+                'author__email',
+                'author__first_name',
+                'author__last_name',
+                'is_favorited',
+                'is_in_shopping_cart',
+                'author_is_subscribed',
+            )
+        )
+
+    def touch(self, **fields):
+        return self.update(
+            revision=F('revision') + 1, updated_at=timezone.now(), **fields
+        )
+
+    def with_tags(self, tag_ids, match_all=False):
+        if match_all:
+            queryset = self
+            for tag_id in set(tag_ids):
+                queryset = queryset.filter(
+                    pk__in=TagRecipe.objects.filter(tag=tag_id).values(
+                        'recipe'
+                    )
+                )
+            return queryset
+        return self.filter(
+            pk__in=TagRecipe.objects.filter(tag__in=tag_ids).values('recipe')
+        )
+
+    def favorited_by(self, user):
+        return self.filter(
+            pk__in=Favorite.objects.filter(user=user).values('recipe')
+        )
+
+    def in_cart_of(self, user):
+        return self.filter(
+            pk__in=ShoppingСart.objects.filter(user=user).values('recipe')
+        )
+
+    def search(self, text):
+        if connection.vendor == 'postgresql':
+            query = SearchQuery(
+                text, config=SEARCH_CONFIG, search_type='websearch'
+            )
+            return self.filter(search_vector=query).annotate(
+                search_rank=SearchRank(F('search_vector'), query)
+            )
+        return self.annotate(
+            has_ingredient=Exists(
+                IngredientRecipe.objects.filter(
+                    recipe=OuterRef('pk'), ingredient__name__icontains=text
+                )
+            )
+        ).filter(
+            Q(name__icontains=text)
+            | Q(text__icontains=text)
+            | Q(has_ingredient=True)
+        )
+
+    def update_search_vector(self):
+        if connection.vendor != 'postgresql':
+            return 0
+        ingredient_names = Subquery(
+            IngredientRecipe.objects.filter(recipe=OuterRef('pk'))
+            .order_by()
+            .values('recipe')
+            .annotate(names=StringAgg('ingredient__name', ' '))
+            .values('names')
+        )
+        return self.update(
+            search_vector=(
+                SearchVector('name', weight='A', config=SEARCH_CONFIG)
+                + SearchVector(
+                    ingredient_names, weight='B', config=SEARCH_CONFIG
+                )
+                + SearchVector('text', weight='C', config=SEARCH_CONFIG)
+            )
+        )
+
+    def latest_by_author(self, author_ids, limit=None):
+        queryset = self.filter(author__in=author_ids)
+        if limit is None:
+            return queryset
+        if not author_ids:
+            return []
+        queryset = queryset.annotate(
+            author_rank=Window(
+                expression=RowNumber(),
+                partition_by=[F('author')],
+                order_by=F('pub_date').desc(),
+            )
+        ).order_by()
+        sql, params = queryset.query.sql_with_params()
+        return self.raw(
+            f'SELECT * FROM ({sql}) ranked '
+            f'WHERE author_rank <= %s ORDER BY author_rank',
+            (*params, limit),
+        )
+
+
 class Recipe(models.Model):
     tags = models.ManyToManyField(
         Tag,
@@ -132,7 +335,14 @@ class Recipe(models.Model):
         max_length=200,
         verbose_name='Название',
     )
-    image = models.ImageField(verbose_name='Картинка', upload_to='recipes/')
+    image = models.ImageField(
+        verbose_name='Картинка',
+        upload_to='recipes/',
+        storage=ContentAddressedStorage(),
+    )
+    image_hash = models.CharField(
+        verbose_name='Хеш картинки', max_length=64, blank=True, editable=False
+    )
     text = models.TextField(verbose_name='Описание')
     cooking_time = models.PositiveIntegerField(
         verbose_name='Время, мин',
@@ -145,6 +355,21 @@ class Recipe(models.Model):
         verbose_name='Дата публикации',
         auto_now_add=True,
     )
+    favorites_count = models.PositiveIntegerField(
+        verbose_name='В избранном', default=0, editable=False
+    )
+    in_carts_count = models.PositiveIntegerField(
+        verbose_name='В списках покупок', default=0, editable=False
+    )
+    updated_at = models.DateTimeField(
+        verbose_name='Дата изменения', auto_now=True
+    )
+    revision = models.PositiveIntegerField(
+        verbose_name='Версия', default=0, editable=False
+    )
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         constraints = [
@@ -152,6 +377,12 @@ class Recipe(models.Model):
                 fields=['name', 'author'], name='unique_name_author'
             )
         ]
+        indexes = [
+            models.Index(fields=['-favorites_count']),
+            models.Index(fields=['-pub_date', '-id']),
+            models.Index(fields=['author', '-pub_date', '-id']),
+            models.Index(fields=['updated_at']),
+        ]
         ordering = ['-pub_date']
         verbose_name = 'Рецепты'
         verbose_name_plural = 'Рецепты'
@@ -194,6 +425,7 @@ class Subscription(models.Model):
                 fields=['author', 'user'], name='unique subscription'
             )
         ]
+        indexes = [models.Index(fields=['user', 'author'])]
         verbose_name = 'Подписки'
         verbose_name_plural = 'Подписки'
         app_label = 'users'
@@ -219,6 +451,7 @@ class ShoppingСart(models.Model):
                 fields=['recipe', 'user'], name='unique shopping cart'
             )
         ]
+        indexes = [models.Index(fields=['user', 'recipe'])]
         verbose_name = 'Список покупок'
         verbose_name_plural = 'Список покупок'
         app_label = 'users'
@@ -244,6 +477,64 @@ class Favorite(models.Model):
                 fields=['recipe', 'user'], name='unique favotite'
             )
         ]
+        indexes = [models.Index(fields=['user', 'recipe'])]
         verbose_name = 'Избранное'
         verbose_name_plural = 'Избранное'
         app_label = 'users'
+
+
+class ShoppingListItemManager(models.Manager):
+    def refresh(self, users, ingredients):
+        with transaction.atomic():
+            list(
+                User.objects.filter(pk__in=users)
+                .order_by('pk')
+                .select_for_update()
+                .values_list('pk', flat=True)
+            )
+            totals = (
+                IngredientRecipe.objects.filter(
+                    recipe__recipe__user__in=users, ingredient__in=ingredients
+                )
+                .values('recipe__recipe__user', 'ingredient')
+                .annotate(total=Sum('amount'))
+            )
+            self.filter(user__in=users, ingredient__in=ingredients).delete()
+            self.bulk_create(
+                self.model(
+                    user_id=row['recipe__recipe__user'],
+                    ingredient_id=row['ingredient'],
+                    amount=row['total'],
+                )
+                for row in totals
+            )
+
+
+class ShoppingListItem(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        verbose_name='Пользователь',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_list_items',
+        verbose_name='Ингредиент',
+    )
+    amount = models.PositiveIntegerField(verbose_name='Количество')
+
+    objects = ShoppingListItemManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'], name='unique shopping list item'
+            )
+        ]
+        verbose_name = 'Итоговый список покупок'
+        verbose_name_plural = 'Итоговый список покупок'
+
+    def __str__(self):
+        return f'{self.ingredient} - {self.amount}'
@@ -0,0 +1,40 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import catalog, cookbook
+from .models import Ingredient, Recipe, Tag, Unit
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Unit)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Unit)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_catalog(sender, **kwargs):
+    transaction.on_commit(catalog.invalidate)
+
+
+@receiver(post_save, sender=Recipe)
+def update_search_vector(sender, instance, created, **kwargs):
+    if not created:
+        Recipe.objects.filter(pk=instance.pk).update_search_vector()
+    record_recipe(instance.pk)
+
+
+@receiver(post_delete, sender=Recipe)
+def forget_recipe(sender, instance, **kwargs):
+    record_recipe(instance.pk)
+
+
+def record_recipe(recipe_id):
+    transaction.on_commit(lambda: cookbook.record(recipe_id))
+
+
+def touch_recipes(recipe_ids):
+    recipes = Recipe.objects.filter(pk__in=recipe_ids)
+    recipes.touch()
+    recipes.update_search_vector()
+    for recipe_id in recipe_ids:
+        record_recipe(recipe_id)
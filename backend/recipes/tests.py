@@ -0,0 +1,87 @@
+import os
+import shutil
+import tempfile
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from . import cookbook
+from .models import Ingredient, IngredientRecipe, Recipe, Unit, User
+from .storage import ContentAddressedStorage
+
+
+class ContentAddressedStorageTest(SimpleTestCase):
+    def setUp(self):
+        self.location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.location, ignore_errors=True)
+        self.storage = ContentAddressedStorage(location=self.location)
+
+    def test_duplicate_save_refreshes_mtime(self):
+        name = self.storage.save('recipes/a.png', ContentFile(b'image'))
+        os.utime(self.storage.path(name), (0, 0))
+        again = self.storage.save('recipes/b.png', ContentFile(b'image'))
+        self.assertEqual(again, name)
+        self.assertGreater(os.path.getmtime(self.storage.path(name)), 0)
+
+    def test_missing_blob_is_written_again(self):
+        name = self.storage.save('recipes/a.png', ContentFile(b'image'))
+        os.remove(self.storage.path(name))
+        self.assertEqual(
+            self.storage.save('recipes/a.png', ContentFile(b'image')), name
+        )
+        self.assertTrue(self.storage.exists(name))
+
+
+class CookbookIndexTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        cookbook._index = None
+        author = User.objects.create(username='author', email='a@a.ru')
+        unit = Unit.objects.create(name='г')
+        self.ingredient = Ingredient.objects.create(
+            name='соль', measurement_unit=unit
+        )
+        self.recipe = Recipe.objects.create(
+            author=author, name='рецепт', text='текст', cooking_time=1
+        )
+
+    def add_ingredient(self):
+        IngredientRecipe.objects.bulk_create(
+            [
+                IngredientRecipe(
+                    recipe=self.recipe, ingredient=self.ingredient, amount=1
+                )
+            ]
+        )
+        Recipe.objects.filter(pk=self.recipe.pk).touch()
+
+    def test_journal_is_applied_incrementally(self):
+        index = cookbook.get_index()
+        self.assertEqual(index.top([self.ingredient.pk], 1), [])
+        self.add_ingredient()
+        cookbook.record(self.recipe.pk)
+        updated = cookbook.get_index()
+        self.assertEqual(
+            updated.top([self.ingredient.pk], 1), [(self.recipe.pk, 1.0)]
+        )
+        self.assertEqual(index.top([self.ingredient.pk], 1), [])
+        self.assertEqual(updated.position, index.position + 1)
+
+    def test_missed_updates_are_synced_by_updated_at(self):
+        self.assertEqual(cookbook.get_index().top([self.ingredient.pk], 1), [])
+        self.add_ingredient()
+        self.assertEqual(cookbook.get_index().top([self.ingredient.pk], 1), [])
+        with override_settings(COOKBOOK_SYNC_INTERVAL=0):
+            self.assertEqual(
+                cookbook.get_index().top([self.ingredient.pk], 1),
+                [(self.recipe.pk, 1.0)],
+            )
+
+    def test_busy_lock_serves_old_snapshot(self):
+        index = cookbook.get_index()
+        self.add_ingredient()
+        cookbook.record(self.recipe.pk)
+        with cookbook._lock:
+            self.assertIs(cookbook.get_index(), index)
+        self.assertIsNot(cookbook.get_index(), index)
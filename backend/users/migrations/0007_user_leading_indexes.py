@@ -0,0 +1,25 @@
+# Generated by Django 3.2.14 on 2026-10-18 19:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0006_counters'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='favorite',
+            index=models.Index(fields=['user', 'recipe'], name='users_favor_user_id_c7d2d5_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shoppingсart',
+            index=models.Index(fields=['user', 'recipe'], name='users_shopp_user_id_ef048a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='subscription',
+            index=models.Index(fields=['user', 'author'], name='users_subsc_user_id_66eb89_idx'),
+        ),
+    ]